@@ -0,0 +1,105 @@
+import logging
+from datetime import date, datetime, timedelta
+
+
+ACADEMIC_YEAR_START_MONTH = 9  # Without configured semester starts, weeks are counted from September 1st
+MAX_WEEK = 54  # Highest week number a date can get: a leap year counted from the Monday before September 1st
+
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value.strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def parse_dates(value):
+    return [parse_date(item) for item in (value or "").split(',') if item.strip()]
+
+
+def parse_transfers(value):
+    # "2024-11-02=2024-11-08": November 2nd is taught by the timetable of November 8th
+    transfers = {}
+    for item in (value or "").split(','):
+        if not item.strip():
+            continue
+        if '=' not in item:
+            raise ValueError(f"Invalid transfer '{item}', expected YYYY-MM-DD=YYYY-MM-DD")
+        working_day, replaced_day = item.split('=', 1)
+        replaced_day = parse_date(replaced_day)
+        if replaced_day.weekday() == 6:
+            raise ValueError(f"Invalid transfer '{item}', {replaced_day} is a Sunday without a timetable")
+        transfers[parse_date(working_day)] = replaced_day
+    return transfers
+
+
+class AcademicCalendar:
+    def __init__(self, semester_starts=(), holidays=(), transfers=None):
+        self.semester_starts = sorted(semester_starts)
+        self.holidays = set(holidays)
+        self.transfers = dict(transfers or {})
+        self.days = {}  # date -> (week, weekday), weekday is None on days without lectures
+        self.year_weeks = {}  # academic year -> {date: week by the semester starts}, transfers not applied
+
+    @classmethod
+    def from_config(cls, semester_starts, holidays, transfers):
+        return cls(parse_dates(semester_starts), parse_dates(holidays), parse_transfers(transfers))
+
+    def lookup(self, day):
+        entry = self.days.get(day)
+        if entry is None:
+            self._build_year(self._academic_year(day))
+            entry = self.days[day]
+        return entry
+
+    def today(self):
+        return self.lookup(datetime.now().date())
+
+    def tomorrow(self):
+        return self.lookup(datetime.now().date() + timedelta(days=1))
+
+    def week(self, day=None):
+        return self.lookup(day or datetime.now().date())[0]
+
+    @staticmethod
+    def _academic_year(day):
+        return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+    def _build_year(self, year):
+        if year in self.year_weeks:
+            return
+        year_start = date(year, ACADEMIC_YEAR_START_MONTH, 1)
+        year_end = date(year + 1, ACADEMIC_YEAR_START_MONTH, 1)
+        starts = [start for start in self.semester_starts if year_start <= start < year_end]
+        if not starts or starts[0] > year_start:
+            starts.insert(0, year_start)  # Days before the first configured start still count from September
+
+        weeks = {}
+        start_index = 0
+        current = year_start
+        while current < year_end:
+            while start_index + 1 < len(starts) and starts[start_index + 1] <= current:
+                start_index += 1
+            semester_start = starts[start_index]
+            first_monday = semester_start - timedelta(days=semester_start.weekday())
+            weeks[current] = max(1, (current - first_monday).days // 7 + 1)
+            current += timedelta(days=1)
+        # Registered before the transfers, a transfer into another year that transfers back finds this one built
+        self.year_weeks[year] = weeks
+
+        for day, week in weeks.items():
+            if day in self.holidays:
+                self.days[day] = (week, None)
+            elif day in self.transfers:
+                replaced = self.transfers[day]
+                replaced_week = weeks.get(replaced) or self._week_outside_year(replaced)
+                self.days[day] = (replaced_week, replaced.weekday())
+            else:
+                self.days[day] = (week, day.weekday() if day.weekday() < 6 else None)
+
+        logging.info(f"Built academic calendar for {year}/{year + 1} with semester starts {starts}")
+
+    def _week_outside_year(self, day):
+        year = self._academic_year(day)
+        self._build_year(year)
+        return self.year_weeks[year][day]
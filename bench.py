@@ -0,0 +1,162 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from generate_schedule_html import generate_schedule_html
+from schedule_bot import parse_html, extract_lecture_info, extract_all_lectures, display_lecture_info
+from schedule_store import ScheduleStore
+from lecture_columns import ColumnarLectureStore
+
+
+BENCH_MIN_SECONDS = 0.5  # Each repeat runs a case at least this long
+BENCH_REPEATS = 3  # The fastest repeat is reported
+BENCH_THRESHOLD = 0.2  # Relative slowdown or memory growth against the baseline that fails the comparison
+BENCH_WEEK = 5
+BENCH_SUBGROUP = "1 подгр"
+BASELINE_PATH = "bench_baseline.json"
+SYNTHETIC_ROWS_PER_DAY = "4,40,200"  # Sizes of the generated tables, a real group has about 4 rows a day
+
+
+def load_pages(patterns):
+    pages = {}
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)):
+            with open(path, encoding='utf-8') as f:
+                pages[os.path.splitext(os.path.basename(path))[0]] = f.read()
+    return pages
+
+
+def merge_pages(pages):
+    # All groups of a crawl in one table, a page far larger than any single group's
+    rows = []
+    for html_doc in pages.values():
+        match = re.search(r'<table[^>]*id="sched"[^>]*>(.*?)</table>', html_doc, re.S)
+        if match:
+            rows.append(match.group(1))
+    return f'<html><body><table id="sched">{"".join(rows)}</table></body></html>'
+
+
+def pipeline_cases(name, html_doc, store):
+    table = parse_html(html_doc)
+    lecture_info = extract_lecture_info(table, BENCH_WEEK, BENCH_SUBGROUP, BENCH_SUBGROUP)
+    store.save_group(name, extract_all_lectures(table))
+    columns = ColumnarLectureStore()
+    columns.update_group(name, extract_all_lectures(table))
+    return {
+        f"{name}/parse": lambda: parse_html(html_doc),
+        f"{name}/extract": lambda: extract_lecture_info(table, BENCH_WEEK, BENCH_SUBGROUP, BENCH_SUBGROUP),
+        f"{name}/extract_all": lambda: extract_all_lectures(table),
+        f"{name}/render": lambda: display_lecture_info(lecture_info),
+        f"{name}/store_read": lambda: store.lecture_info(name, BENCH_WEEK, BENCH_SUBGROUP, BENCH_SUBGROUP),
+        f"{name}/columns_read": lambda: columns.lecture_info(name, BENCH_WEEK, BENCH_SUBGROUP, BENCH_SUBGROUP),
+        f"{name}/pipeline": lambda: display_lecture_info(
+            extract_lecture_info(parse_html(html_doc), BENCH_WEEK, BENCH_SUBGROUP, BENCH_SUBGROUP)
+        ),
+    }
+
+
+def measure(case, min_seconds=BENCH_MIN_SECONDS, repeats=BENCH_REPEATS):
+    best = None
+    for _ in range(repeats):
+        runs = 0
+        started = time.perf_counter()
+        while True:
+            case()
+            runs += 1
+            elapsed = time.perf_counter() - started
+            if elapsed >= min_seconds:
+                break
+        rate = runs / elapsed
+        best = rate if best is None else max(best, rate)
+
+    # Memory is measured on a separate run, tracing slows the code down several times
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    result = case()
+    after, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics('filename'))
+    tracemalloc.stop()
+    del result
+    return {
+        'ops_per_second': best,
+        'peak_kib': (peak - before) / 1024,
+        'retained_kib': (after - before) / 1024,
+        'retained_blocks': blocks,
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['ops_per_second'] < previous['ops_per_second'] * (1 - threshold):
+            regressions.append(f"{name}: {result['ops_per_second']:.1f} ops/s, baseline {previous['ops_per_second']:.1f}")
+        # Small allocations vary between runs, only growth beyond a page of memory counts
+        if result['peak_kib'] > previous['peak_kib'] * (1 + threshold) + 4:
+            regressions.append(f"{name}: peak {result['peak_kib']:.1f} KiB, baseline {previous['peak_kib']:.1f} KiB")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark parsing, extraction and rendering of schedule pages")
+    parser.add_argument('--pages', nargs='*', default=["crawl_pages/*.html"], help="Saved schedule pages (globs)")
+    parser.add_argument('--synthetic', default=SYNTHETIC_ROWS_PER_DAY,
+                        help="Rows per day of generated tables, comma separated, empty to skip")
+    parser.add_argument('--filter', default='', help="Only run cases whose name contains this text")
+    parser.add_argument('--min-seconds', type=float, default=BENCH_MIN_SECONDS)
+    parser.add_argument('--repeats', type=int, default=BENCH_REPEATS)
+    parser.add_argument('--save-baseline', nargs='?', const=BASELINE_PATH, help="Write the results as the baseline")
+    parser.add_argument('--compare', nargs='?', const=BASELINE_PATH, help="Fail on regressions against the baseline")
+    parser.add_argument('--threshold', type=float, default=BENCH_THRESHOLD)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    synthetic = [int(rows) for rows in args.synthetic.split(',') if rows.strip()]
+    if not pages and not synthetic:
+        parser.error(f"No schedule pages match {args.pages} and no synthetic tables requested")
+
+    cases = {}
+    store = ScheduleStore(os.path.join(tempfile.mkdtemp(prefix="schedule_bench_"), "schedules.db"))
+    for name, html_doc in pages.items():
+        cases.update(pipeline_cases(name, html_doc, store))
+    if len(pages) > 1:
+        cases.update(pipeline_cases(f"merged_{len(pages)}", merge_pages(pages), store))
+    for rows in synthetic:
+        cases.update(pipeline_cases(f"synthetic_{rows}_rows", generate_schedule_html(rows_per_day=rows, seed=rows), store))
+
+    results = {}
+    print(f"{'case':40} {'ops/s':>12} {'peak KiB':>10} {'retained KiB':>12} {'blocks':>8}")
+    for name, case in cases.items():
+        if args.filter not in name:
+            continue
+        result = results[name] = measure(case, args.min_seconds, args.repeats)
+        print(f"{name:40} {result['ops_per_second']:12.1f} {result['peak_kib']:10.1f} "
+              f"{result['retained_kib']:12.1f} {result['retained_blocks']:8}")
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions above {args.threshold:.0%} against {args.compare}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"No regressions above {args.threshold:.0%} against {args.compare}")
+
+
+if __name__ == '__main__':
+    main()
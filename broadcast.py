@@ -0,0 +1,275 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from telebot.apihelper import ApiTelegramException
+
+from metrics import REGISTRY
+
+
+SEND_RATE_PER_SECOND = 25  # Global send rate, kept below Telegram's ~30 messages per second limit
+SEND_WORKERS = 4  # Parallel senders so network round trips overlap under the rate limit
+SEND_QUEUE_SIZE = 1000  # Bounded queue gives backpressure to the producer instead of buffering 50k items
+PROGRESS_LOG_EVERY = 500  # Log broadcast progress every N processed chats
+
+
+SEND_SECONDS = REGISTRY.histogram('telegram_send_seconds', "Duration of Telegram send calls", ['method'])
+SEND_ERRORS = REGISTRY.counter('telegram_send_errors_total', "Failed Telegram send calls by error code", ['method', 'code'])
+
+
+def observe_send(method, send, *args, **kwargs):
+    started = time.perf_counter()
+    try:
+        return send(*args, **kwargs)
+    except ApiTelegramException as e:
+        SEND_ERRORS.inc(method, e.error_code)
+        raise
+    except Exception:
+        SEND_ERRORS.inc(method, 'network')
+        raise
+    finally:
+        SEND_SECONDS.observe(time.perf_counter() - started, method)
+
+
+def parse_digest_time(value):
+    try:
+        return datetime.strptime(value.strip(), "%H:%M").time()
+    except ValueError:
+        raise ValueError(f"Invalid digest time '{value}', expected HH:MM")
+
+
+class SubscriptionStore:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.subscribers = {}  # chat_id -> (group, subgroup, sub_subgroup)
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Failed to load subscriptions from {self.path}: {e}")
+            return
+        self.subscribers = {int(chat_id): tuple(key) for chat_id, key in data.items()}
+        logging.info(f"Loaded {len(self.subscribers)} subscriptions")
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({str(chat_id): list(key) for chat_id, key in self.subscribers.items()}, f)
+        os.replace(tmp_path, self.path)
+
+    def subscribe(self, chat_id, key):
+        with self.lock:
+            self.subscribers[chat_id] = tuple(key)
+            self.save()
+
+    def unsubscribe(self, chat_id):
+        with self.lock:
+            if self.subscribers.pop(chat_id, None) is None:
+                return False
+            self.save()
+            return True
+
+    def grouped(self):
+        with self.lock:
+            chats_by_key = defaultdict(list)
+            for chat_id, key in self.subscribers.items():
+                chats_by_key[key].append(chat_id)
+        return chats_by_key
+
+
+class RateLimiter:
+    def __init__(self, rate_per_second):
+        self.interval = 1.0 / rate_per_second
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def pause(self, seconds):
+        with self.lock:
+            self.next_slot = max(self.next_slot, time.monotonic() + seconds)
+
+
+class BroadcastJob:
+    def __init__(self, name):
+        self.name = name
+        self.total = 0
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+        self.producing = True
+
+    def progress(self):
+        with self.lock:
+            elapsed = (self.finished_at or time.monotonic()) - self.started_at
+            processed = self.sent + self.failed
+            return {
+                'name': self.name,
+                'total': self.total,
+                'sent': self.sent,
+                'failed': self.failed,
+                'retried': self.retried,
+                'pending': self.total - processed,
+                'elapsed': elapsed,
+                'rate': processed / elapsed if elapsed > 0 else 0.0,
+            }
+
+    def record(self, success):
+        with self.lock:
+            if success:
+                self.sent += 1
+            else:
+                self.failed += 1
+            processed = self.sent + self.failed
+            finished = not self.producing and processed == self.total
+            if finished:
+                self.finished_at = time.monotonic()
+        if finished:
+            self.log_progress()
+            self.done.set()
+        elif processed % PROGRESS_LOG_EVERY == 0:
+            self.log_progress()
+
+    def close(self):
+        with self.lock:
+            self.producing = False
+            finished = self.sent + self.failed == self.total
+            if finished:
+                self.finished_at = time.monotonic()
+        if finished:
+            self.log_progress()
+            self.done.set()
+
+    def log_progress(self):
+        p = self.progress()
+        logging.info(
+            f"Broadcast '{p['name']}': {p['sent']} sent, {p['failed']} failed, {p['pending']} pending "
+            f"of {p['total']} ({p['rate']:.1f} msg/s, {p['elapsed']:.1f}s)"
+        )
+
+
+class SendQueue:
+    def __init__(self, bot, rate_per_second=SEND_RATE_PER_SECOND, workers=SEND_WORKERS, on_blocked=None):
+        self.bot = bot
+        self.limiter = RateLimiter(rate_per_second)
+        self.workers = workers
+        self.on_blocked = on_blocked
+        self.queue = queue.Queue(maxsize=SEND_QUEUE_SIZE)
+        self.threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"send-worker-{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def submit(self, job, chat_ids, parts):
+        # parts is shared by every chat of the same rendering, only references are queued
+        for chat_id in chat_ids:
+            with job.lock:
+                job.total += 1
+            self.queue.put((job, chat_id, parts))
+
+    def _worker(self):
+        while True:
+            job, chat_id, parts = self.queue.get()
+            try:
+                job.record(self._deliver(job, chat_id, parts))
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, job, chat_id, parts):
+        index = 0
+        while index < len(parts):
+            self.limiter.wait()
+            try:
+                observe_send('send_message', self.bot.send_message, chat_id, parts[index], parse_mode='Markdown')
+                index += 1
+            except ApiTelegramException as e:
+                if e.error_code == 429:
+                    retry_after = e.result_json.get('parameters', {}).get('retry_after', 1)
+                    logging.warning(f"Rate limited by Telegram, pausing sends for {retry_after} seconds")
+                    self.limiter.pause(retry_after)
+                    with job.lock:
+                        job.retried += 1
+                    continue
+                if e.error_code == 403 and self.on_blocked:
+                    self.on_blocked(chat_id)
+                logging.warning(f"Failed to deliver broadcast to chat {chat_id}: {e.description}")
+                return False
+            except Exception as e:
+                logging.error(f"Failed to deliver broadcast to chat {chat_id}: {e}")
+                return False
+        return True
+
+
+class DigestBroadcaster:
+    def __init__(self, subscriptions, send_queue, render, digest_time):
+        self.subscriptions = subscriptions
+        self.send_queue = send_queue
+        self.render = render  # render(date, key) -> message parts for every chat sharing that key
+        self.digest_time = digest_time
+        self.stop_event = threading.Event()
+        self.last_job = None
+
+    def start(self):
+        threading.Thread(target=self._loop, name="digest-broadcaster", daemon=True).start()
+        logging.info(f"Daily digest scheduled at {self.digest_time.strftime('%H:%M')}")
+
+    def stop(self):
+        self.stop_event.set()
+
+    def next_run(self, now=None):
+        now = now or datetime.now()
+        run_at = datetime.combine(now.date(), self.digest_time)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        return run_at
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            run_at = self.next_run()
+            if self.stop_event.wait((run_at - datetime.now()).total_seconds()):
+                return
+            try:
+                self.broadcast(run_at.date() + timedelta(days=1))
+            except Exception as e:
+                logging.error(f"Daily digest broadcast failed: {e}")
+
+    def broadcast(self, date):
+        chats_by_key = self.subscriptions.grouped()
+        job = BroadcastJob(f"digest {date.isoformat()}")
+        self.last_job = job
+        logging.info(f"Starting digest broadcast for {date.isoformat()}: "
+                     f"{sum(map(len, chats_by_key.values()))} chats, {len(chats_by_key)} renderings")
+
+        for key, chat_ids in chats_by_key.items():
+            parts = self.render(date, key)
+            if parts:
+                self.send_queue.submit(job, chat_ids, parts)
+        job.close()
+        return job
@@ -0,0 +1,82 @@
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+
+# Cumulative import time of the bot module allowed on a cold start. Well above the 250-700 ms measured on
+# different machines, the timing catches gross regressions and LAZY_IMPORTS the ones that matter most
+IMPORT_TIME_BUDGET_MS = 1000
+IMPORT_TIME_RUNS = 5  # The fastest run is compared, the first one also compiles the bytecode
+LAZY_IMPORTS = ['bs4']  # Loaded with the first page, importing them with the bot fails whatever the timing
+IMPORT_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def measure(module):
+    # -> (cumulative microseconds of the module, [(cumulative microseconds, name)] of the imports it triggered)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    if result.returncode:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    total = None
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, indent, name = int(match.group(2)), len(match.group(3)), match.group(4)
+        imports.append((cumulative, name))
+        if name == module and indent == 1:
+            total = cumulative
+    if total is None:
+        raise RuntimeError(f"No import time reported for {module}")
+    return total, imports
+
+
+def check(module, budget_ms, runs=IMPORT_TIME_RUNS):
+    # -> (milliseconds of the fastest run, its imports, [problem]); no problems means the check passed
+    total, imports = min((measure(module) for _ in range(runs)), key=lambda run: run[0])
+    total_ms = total / 1000
+    problems = []
+    if total_ms > budget_ms:
+        problems.append(f"Import time {total_ms:.1f} ms exceeds the budget of {budget_ms:.0f} ms")
+    imported = {name for _, name in imports}
+    for name in LAZY_IMPORTS:
+        if name in imported:
+            problems.append(f"{module} imports {name} at startup, it should be loaded on first use")
+    return total_ms, imports, problems
+
+
+def test_import_time():
+    # Collected when pytest is pointed at this file, e.g. `python -m pytest check_import_time.py`
+    budget_ms = float(os.environ.get("IMPORT_TIME_BUDGET_MS", IMPORT_TIME_BUDGET_MS))
+    _, _, problems = check('schedule_bot', budget_ms)
+    assert not problems, "; ".join(problems)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when importing the bot takes longer than the budget")
+    parser.add_argument('--module', default='schedule_bot')
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get("IMPORT_TIME_BUDGET_MS", IMPORT_TIME_BUDGET_MS)))
+    parser.add_argument('--runs', type=int, default=IMPORT_TIME_RUNS)
+    parser.add_argument('--top', type=int, default=10, help="Number of slowest imports to print")
+    args = parser.parse_args()
+
+    total_ms, imports, problems = check(args.module, args.budget_ms, args.runs)
+    print(f"Slowest imports of {args.module}:")
+    for cumulative, name in sorted(imports, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    if problems:
+        print("\n".join(problems))
+        sys.exit(1)
+    print(f"Import time {total_ms:.1f} ms is within the budget of {args.budget_ms:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+from fuzzy_search import TrigramIndex
+from lecture_columns import ColumnarLectureStore
+from generate_schedule_html import generate_schedule_html
+from schedule_bot import (
+    parse_html, extract_all_lectures, extract_lecture_info, display_lecture_info, split_message, search_terms
+)
+from schedule_index import TeacherIndex, RoomIndex
+
+
+# Retained KiB allowed per cached group (per cached week for the render cache), about 1.5x the measured figures.
+# Parsed pages are not kept, the bot reads lectures from the schedule store
+MEMORY_BUDGETS_KIB = {
+    'indexes': 240,
+    'render_cache': 6,
+    'lecture_columns': 20,
+}
+MEMORY_CHECK_GROUPS = 20  # Groups loaded per measurement, enough to average out allocator noise
+MEMORY_CHECK_ROWS_PER_DAY = 6  # Size of the generated pages, a busy real group
+
+
+def retained(build):
+    # -> (result of build(), bytes it keeps alive once temporaries are collected)
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    return result, tracemalloc.get_traced_memory()[0] - before
+
+
+def measure(groups, rows_per_day):
+    # -> ({component: retained bytes per group}, {lecture representation: retained bytes per lecture})
+    pages = [generate_schedule_html(rows_per_day=rows_per_day, seed=f"memory:{group}") for group in range(groups)]
+    tracemalloc.start()
+    try:
+        tables = [parse_html(page) for page in pages]
+        lectures = [extract_all_lectures(table) for table in tables]
+
+        def build_indexes():
+            indexes = TeacherIndex(), RoomIndex(), TrigramIndex()
+            for group, group_lectures in enumerate(lectures):
+                indexes[0].update_group(group, group_lectures)
+                indexes[1].update_group(group, group_lectures)
+                indexes[2].update_group(group, search_terms(str(group), group_lectures))
+            return indexes
+
+        def build_columns():
+            store = ColumnarLectureStore()
+            for group, table in enumerate(tables):
+                store.update_group(group, extract_all_lectures(table))
+            return store
+
+        # Both built from fresh records, so each keeps its own strings
+        _, dicts_bytes = retained(lambda: [extract_all_lectures(table) for table in tables])
+        _, columns_bytes = retained(build_columns)
+        _, indexes_bytes = retained(build_indexes)
+        # The render cache only holds the bot's own group, one entry per week and subgroup asked for
+        _, render_bytes = retained(lambda: {
+            week: split_message(display_lecture_info(extract_lecture_info(tables[0], week, "1 подгр", "1 подгр")))
+            for week in range(1, groups + 1)
+        })
+    finally:
+        tracemalloc.stop()
+    lecture_count = sum(len(group_lectures) for group_lectures in lectures)
+    return {
+        'indexes': indexes_bytes / groups,
+        'render_cache': render_bytes / groups,
+        'lecture_columns': columns_bytes / groups,
+    }, {
+        'dicts': dicts_bytes / lecture_count,
+        'columns': columns_bytes / lecture_count,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a cached group keeps more memory than the budget")
+    parser.add_argument('--groups', type=int, default=MEMORY_CHECK_GROUPS)
+    parser.add_argument('--rows-per-day', type=int, default=MEMORY_CHECK_ROWS_PER_DAY)
+    parser.add_argument('--scale', type=float, default=float(os.environ.get("MEMORY_BUDGET_SCALE", 1.0)),
+                        help="Multiplies every budget")
+    args = parser.parse_args()
+
+    sizes, per_lecture = measure(args.groups, args.rows_per_day)
+    print(f"Bytes per lecture: {per_lecture['dicts']:.0f} as dicts, {per_lecture['columns']:.0f} in columns "
+          f"({per_lecture['dicts'] / per_lecture['columns']:.1f}x less)")
+    over_budget = False
+    for component, size in sizes.items():
+        budget = MEMORY_BUDGETS_KIB[component] * args.scale
+        verdict = "ok" if size / 1024 <= budget else "OVER BUDGET"
+        over_budget |= size / 1024 > budget
+        print(f"  {component:15} {size / 1024:8.1f} KiB per entry, budget {budget:6.0f} KiB  {verdict}")
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
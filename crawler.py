@@ -0,0 +1,243 @@
+import argparse
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from broadcast import RateLimiter
+
+
+CRAWL_WORKERS = 4  # Concurrent requests to the university website
+CRAWL_DELAY_SECONDS = 0.5  # Politeness delay between two requests, shared by all workers
+CRAWL_TIMEOUT_SECONDS = 10  # Timeout for a single catalog request
+CRAWL_RETRIES = 3  # Attempts per catalog request
+CHECKPOINT_PATH = "crawl_checkpoint.json"  # Discovered catalog and progress of the current crawl
+PAGES_DIR = "crawl_pages"  # Schedule pages fetched by the current crawl
+CRAWL_PAGE_MAX_AGE_SECONDS = 24 * 60 * 60  # A resumed crawl fetches saved pages older than this again
+CHECKPOINT_EVERY = 50  # Pages or catalog levels between two checkpoint writes
+CHECKPOINT_INTERVAL_SECONDS = 30  # Or seconds, whichever comes first; an interrupted crawl redoes at most that much
+
+# The form is filled level by level, each level is loaded by posting the values chosen so far
+CATALOG_LEVELS = ['faculty', 'form', 'course', 'group']
+CATALOG_ACTIONS = {
+    'form': '__id.25.main.inpFldsA.GetForms__sp.4.form__fp.4.main',
+    'course': '__id.25.main.inpFldsA.GetCourse__sp.6.course__fp.4.main',
+    'group': '__id.25.main.inpFldsA.GetGroups__sp.5.group__fp.4.main',
+}
+
+
+def schedule_form(group_form):
+    # The form fields of a catalog entry, without the group name the catalog adds
+    return {name: group_form[name] for name in CATALOG_LEVELS}
+
+
+def parse_options(html, name=None):
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    scope = soup.find('select', {'name': name}) if name else None
+    options = (scope or soup).find_all('option')
+    return [[option.get('value', '').strip(), option.text.strip()] for option in options if option.get('value', '').strip()]
+
+
+class Crawler:
+    def __init__(self, website_url, fetch_schedule, checkpoint_path=CHECKPOINT_PATH, pages_dir=PAGES_DIR,
+                 workers=CRAWL_WORKERS, delay=CRAWL_DELAY_SECONDS):
+        self.website_url = website_url
+        # fetch_schedule(website_url, week, group_form, before_attempt) -> html, calling before_attempt() before
+        # every attempt so retries keep the politeness delay too
+        self.fetch_schedule = fetch_schedule
+        self.checkpoint_path = checkpoint_path
+        self.pages_dir = pages_dir
+        self.workers = workers
+        self.limiter = RateLimiter(1 / delay) if delay > 0 else None
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        self.options = {}  # "faculty=11|form=10" -> [[value, name]] of the next level, kept until a discovery completes
+        self.fetched = {}  # group -> {'path', 'week', 'fetched_at'} of the page saved by the current crawl
+        self.unsaved = 0  # Changes since the checkpoint was last written
+        self.saved_at = time.monotonic()
+        self.load_checkpoint()
+
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_path):
+            return
+        try:
+            with open(self.checkpoint_path, encoding='utf-8') as f:
+                checkpoint = json.load(f)
+        except (OSError, ValueError) as e:
+            logging.error(f"Ignoring unreadable crawl checkpoint {self.checkpoint_path}: {e}")
+            return
+        self.options = checkpoint.get('options', {})
+        self.fetched = checkpoint.get('fetched', {})
+        logging.info(f"Resuming crawl: {len(self.options)} catalog requests and {len(self.fetched)} pages already done")
+
+    def save_checkpoint(self):
+        with self.lock:
+            self._write_checkpoint()
+
+    def _changed(self):
+        # Counts a change, the whole checkpoint is only rewritten every CHECKPOINT_EVERY changes or seconds
+        with self.lock:
+            self.unsaved += 1
+            if self.unsaved >= CHECKPOINT_EVERY or time.monotonic() - self.saved_at >= CHECKPOINT_INTERVAL_SECONDS:
+                self._write_checkpoint()
+
+    def _write_checkpoint(self):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'options': self.options, 'fetched': self.fetched}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.unsaved = 0
+        self.saved_at = time.monotonic()
+
+    def _wait_turn(self):
+        if self.limiter:
+            self.limiter.wait()
+
+    def _post(self, data):
+        for attempt in range(1, CRAWL_RETRIES + 1):
+            self._wait_turn()
+            try:
+                response = self.session.post(self.website_url, data=data, timeout=CRAWL_TIMEOUT_SECONDS)
+                response.raise_for_status()
+                return response.text
+            except requests.exceptions.RequestException as e:
+                logging.warning(f"Catalog request attempt {attempt} failed: {e}")
+        raise RuntimeError(f"Failed to load catalog level for {data}")
+
+    def _load_level(self, chosen):
+        key = '|'.join(f"{name}={value}" for name, value in chosen.items())
+        if key in self.options:
+            return self.options[key]
+
+        level = CATALOG_LEVELS[len(chosen)]
+        if chosen:
+            options = parse_options(self._post({**chosen, '__act': CATALOG_ACTIONS[level]}), level)
+        else:
+            self._wait_turn()
+            response = self.session.get(self.website_url, timeout=CRAWL_TIMEOUT_SECONDS)
+            response.raise_for_status()
+            options = parse_options(response.text, level)
+
+        with self.lock:
+            self.options[key] = options
+        self._changed()
+        return options
+
+    def discover_catalog(self, refresh=False):
+        logging.info("Discovering group catalog")
+        if refresh:
+            with self.lock:
+                self.options = {}
+        catalog = []
+        failed = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            pending = {executor.submit(self._load_level, {}): {}}
+            while pending:
+                future = next(as_completed(pending))
+                chosen = pending.pop(future)
+                try:
+                    options = future.result()
+                except (RuntimeError, requests.exceptions.RequestException) as e:
+                    failed += 1
+                    logging.error(f"Skipping catalog branch {chosen}: {e}")
+                    continue
+
+                level = CATALOG_LEVELS[len(chosen)]
+                for value, name in options:
+                    branch = {**chosen, level: value}
+                    if level == CATALOG_LEVELS[-1]:
+                        catalog.append({**branch, 'name': name})
+                    else:
+                        pending[executor.submit(self._load_level, branch)] = branch
+
+        if not failed:
+            # The discovery is complete, the next one asks the website again and finds new or renamed groups
+            with self.lock:
+                self.options = {}
+        self.save_checkpoint()
+        logging.info(f"Discovered {len(catalog)} groups")
+        return catalog
+
+    def _page_path(self, group):
+        return os.path.join(self.pages_dir, f"{group}.html")
+
+    def _saved_page(self, group, week):
+        # Path of the page an interrupted crawl saved for the same week, None when it is missing or too old
+        saved = self.fetched.get(group)
+        if not isinstance(saved, dict) or saved.get('week') != week:
+            return None
+        if time.time() - saved.get('fetched_at', 0) > CRAWL_PAGE_MAX_AGE_SECONDS or not os.path.exists(saved['path']):
+            return None
+        return saved['path']
+
+    def _fetch_group(self, group_form, week):
+        group = group_form['group']
+        saved_path = self._saved_page(group, week)
+        if saved_path:
+            with open(saved_path, encoding='utf-8') as f:
+                return f.read()
+
+        html_doc = self.fetch_schedule(self.website_url, week, schedule_form(group_form),
+                                       before_attempt=self._wait_turn)
+        path = self._page_path(group)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(html_doc)
+        with self.lock:
+            self.fetched[group] = {'path': path, 'week': week, 'fetched_at': time.time()}
+        self._changed()
+        return html_doc
+
+    def fetch_schedules(self, group_forms, week):
+        # Yields (group_form, html) as pages arrive; a crawl interrupted half way reuses the pages it already saved
+        os.makedirs(self.pages_dir, exist_ok=True)
+        failed = 0
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(self._fetch_group, group_form, week): group_form
+                           for group_form in group_forms}
+                for future in as_completed(futures):
+                    group_form = futures[future]
+                    try:
+                        html_doc = future.result()
+                    except (RuntimeError, OSError) as e:
+                        failed += 1
+                        logging.error(f"Failed to crawl group {group_form['group']}: {e}")
+                        continue
+                    yield group_form, html_doc
+
+            if not failed:
+                # The crawl is complete, the next one starts from fresh pages
+                with self.lock:
+                    self.fetched = {}
+        finally:
+            self.save_checkpoint()  # Also when the caller stops early, the pages fetched so far are kept
+        logging.info(f"Crawled {len(group_forms) - failed} of {len(group_forms)} groups")
+
+
+def main():
+    from logging_setup import setup_logging
+    from schedule_bot import fetch_data
+
+    parser = argparse.ArgumentParser(description="Discover the group catalog and fetch every group's schedule")
+    parser.add_argument('website_url')
+    parser.add_argument('--week', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=CRAWL_WORKERS)
+    parser.add_argument('--delay', type=float, default=CRAWL_DELAY_SECONDS)
+    parser.add_argument('--refresh-catalog', action='store_true')
+    args = parser.parse_args()
+    setup_logging()
+
+    crawler = Crawler(args.website_url, fetch_data, workers=args.workers, delay=args.delay)
+    catalog = crawler.discover_catalog(refresh=args.refresh_catalog)
+    for _ in crawler.fetch_schedules(catalog, args.week):
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import json
+import logging
+import os
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+from crawler import CATALOG_LEVELS
+
+
+# Local stand-in for the university schedule form. It serves saved pages from a directory:
+# <group>.html files, and optionally catalog.json with [{"faculty", "form", "course", "group", "name"}]
+class FakeScheduleSite:
+    def __init__(self, pages_dir):
+        self.pages_dir = pages_dir
+        self.requests = 0
+        catalog_path = os.path.join(pages_dir, 'catalog.json')
+        if os.path.exists(catalog_path):
+            with open(catalog_path, encoding='utf-8') as f:
+                self.catalog = json.load(f)
+        else:
+            self.catalog = [
+                {'faculty': '11', 'form': '10', 'course': '1', 'group': name[:-5], 'name': name[:-5]}
+                for name in sorted(os.listdir(pages_dir)) if name.endswith('.html')
+            ]
+
+    def options(self, chosen):
+        level = CATALOG_LEVELS[len(chosen)]
+        values = {}
+        for entry in self.catalog:
+            if all(entry[name] == value for name, value in chosen.items()):
+                values.setdefault(entry[level], entry['name'] if level == 'group' else entry[level])
+        options = ''.join(f'<option value="{value}">{name}</option>' for value, name in values.items())
+        return f'<select name="{level}"><option value="">---</option>{options}</select>'
+
+    def page(self, group):
+        path = os.path.join(self.pages_dir, f"{os.path.basename(group)}.html")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+
+    def serve(self, host='127.0.0.1', port=8081):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.requests += 1
+                self.reply(200, f"<html><body><form>{site.options({})}</form></body></html>")
+
+            def do_POST(self):
+                site.requests += 1
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode('utf-8')
+                fields = {name: values[0] for name, values in parse_qs(body, keep_blank_values=True).items()}
+                if 'GetSchedule' in fields.get('__act', ''):
+                    page = site.page(fields.get('group', ''))
+                    self.reply(200, page) if page is not None else self.reply(404, "Not found")
+                    return
+                chosen = {}
+                for name in CATALOG_LEVELS[:-1]:
+                    if not fields.get(name):
+                        break
+                    chosen[name] = fields[name]
+                self.reply(200, site.options(chosen))
+
+            def reply(self, status, text):
+                payload = text.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        logging.info(f"Fake schedule site serving {self.pages_dir} on http://{host}:{server.server_port}/")
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve saved schedule pages like the university website")
+    parser.add_argument('pages_dir')
+    parser.add_argument('--port', type=int, default=8081)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    FakeScheduleSite(args.pages_dir).serve(port=args.port).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import argparse
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Local stand-in for the Telegram Bot API. Point telebot at it with
+# apihelper.API_URL = "http://127.0.0.1:<port>/bot{0}/{1}" and feed it updates with inject()
+class FakeTelegramApi:
+    def __init__(self, latency=0.0):
+        self.latency = latency  # Added to every call except getUpdates, like the round trip to Telegram
+        self.condition = threading.Condition()
+        self.updates = []  # Updates not confirmed by the bot yet, ascending update_id
+        self.next_update_id = 1
+        self.next_message_id = 1
+        self.injected_at = defaultdict(deque)  # chat_id -> perf_counter of its unanswered updates, oldest first
+        self.latencies = []  # Seconds from injecting an update to the reply answering it
+        self.first_injected_at = None
+        self.last_reply_at = None
+        self.calls = defaultdict(int)  # API method -> number of calls
+        self.webhook_url = ''
+
+    def inject(self, chat_id, text):
+        self.inject_message({
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': {'id': chat_id, 'is_bot': False, 'first_name': "Load", 'username': f"load{chat_id}"},
+            'text': text,
+        })
+
+    def inject_message(self, message):
+        # The message gets a fresh ID and date, the rest is sent as given
+        with self.condition:
+            now = time.perf_counter()
+            message = {**message, 'message_id': self.next_message_id, 'date': int(time.time())}
+            self.updates.append({'update_id': self.next_update_id, 'message': message})
+            self.next_update_id += 1
+            self.next_message_id += 1
+            self.injected_at[message['chat']['id']].append(now)
+            if self.first_injected_at is None:
+                self.first_injected_at = now
+            self.condition.notify_all()
+
+    def inject_many(self, texts, count, rate, first_chat_id=1000000):
+        # Every update comes from its own chat, so a reply is matched to exactly one update
+        started = time.perf_counter()
+        for i in range(count):
+            delay = started + i / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            self.inject(first_chat_id + i, texts[i % len(texts)])
+
+    def get_updates(self, offset, limit, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            # Like Telegram, asking for an offset confirms every earlier update
+            self.updates = [update for update in self.updates if update['update_id'] >= offset]
+            while not self.updates:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self.condition.wait(remaining)
+            return self.updates[:limit]
+
+    def record_reply(self, chat_id):
+        # A reply answers the chat's oldest unanswered update; further replies to the same update are not counted
+        # while the chat has nothing pending, and are attributed to the next update otherwise
+        with self.condition:
+            pending = self.injected_at.get(chat_id)
+            if pending:
+                self.last_reply_at = time.perf_counter()
+                self.latencies.append(self.last_reply_at - pending.popleft())
+                self.condition.notify_all()
+
+    def wait_for_replies(self, count, timeout):
+        deadline = time.monotonic() + timeout
+        with self.condition:
+            while len(self.latencies) < count:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+    def call(self, method, params):
+        with self.condition:
+            self.calls[method] += 1
+        if method == 'getUpdates':
+            return self.get_updates(int(params.get('offset', 0)), int(params.get('limit', 100)),
+                                    float(params.get('timeout', 0)))
+
+        if self.latency:
+            time.sleep(self.latency)
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': "Fake", 'username': "fake_schedule_bot"}
+        if method in ('sendMessage', 'sendPhoto', 'sendDocument'):
+            chat_id = int(params['chat_id'])
+            self.record_reply(chat_id)
+            with self.condition:
+                message_id = self.next_message_id
+                self.next_message_id += 1
+            message = {
+                'message_id': message_id,
+                'date': int(time.time()),
+                'chat': {'id': chat_id, 'type': 'private'},
+                'from': {'id': 1, 'is_bot': True, 'first_name': "Fake"},
+            }
+            if method == 'sendMessage':
+                message['text'] = params.get('text', '')
+            elif method == 'sendPhoto':
+                message['photo'] = [{'file_id': "photo", 'file_unique_id': "photo", 'width': 1, 'height': 1}]
+            else:
+                message['document'] = {'file_id': "document", 'file_unique_id': "document"}
+            return message
+        if method == 'setWebhook':
+            self.webhook_url = params.get('url', '')
+            return True
+        if method == 'deleteWebhook':
+            self.webhook_url = ''
+            return True
+        if method == 'getWebhookInfo':
+            return {'url': self.webhook_url, 'has_custom_certificate': False, 'pending_update_count': len(self.updates)}
+        # answerCallbackQuery and anything else the bot does not read the answer of
+        return True
+
+    def serve(self, host='127.0.0.1', port=8082):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                self.handle_call()
+
+            def do_POST(self):
+                self.handle_call()
+
+            def handle_call(self):
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                content_type = self.headers.get('Content-Type', '')
+                if content_type.startswith('application/x-www-form-urlencoded'):
+                    params.update({name: values[0] for name, values in parse_qs(body.decode('utf-8')).items()})
+                elif content_type.startswith('application/json') and body:
+                    params.update(json.loads(body))
+                # Multipart bodies only carry uploaded files, telebot sends the other fields in the query
+
+                method = url.path.rsplit('/', 1)[-1]
+                try:
+                    payload = {'ok': True, 'result': api.call(method, params)}
+                    status = 200
+                except (KeyError, ValueError) as e:
+                    payload = {'ok': False, 'error_code': 400, 'description': f"Bad Request: {e}"}
+                    status = 400
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        logging.info(f"Fake Telegram Bot API serving on http://{host}:{server.server_port}/")
+        return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in for the Telegram Bot API")
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every call but getUpdates")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    FakeTelegramApi(args.latency).serve(port=args.port).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
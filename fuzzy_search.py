@@ -0,0 +1,99 @@
+import heapq
+import math
+from collections import defaultdict
+
+from schedule_index import normalize_name
+
+
+MIN_SIMILARITY = 0.5  # Share of the query's trigrams an entry must contain to be reported
+
+
+def trigrams(text):
+    padded = f"  {normalize_name(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self):
+        self.documents = {}  # (kind, text) -> doc id
+        self.texts = []  # doc id -> (kind, text), None once removed
+        self.doc_trigrams = []  # doc id -> trigram set
+        self.references = []  # doc id -> number of groups the entry was extracted from
+        self.free_ids = []
+        self.postings = defaultdict(set)  # trigram -> doc ids
+        self.group_terms = {}  # group -> set of (kind, text) it contributed
+
+    def __len__(self):
+        return len(self.documents)
+
+    def update_group(self, group, terms):
+        # Only the difference against the group's previous snapshot touches the postings
+        terms = set(terms)
+        previous = self.group_terms.get(group, set())
+        for term in previous - terms:
+            self._release(term)
+        for term in terms - previous:
+            self._acquire(term)
+        self.group_terms[group] = terms
+
+    def remove_group(self, group):
+        self.update_group(group, ())
+        del self.group_terms[group]
+
+    def _acquire(self, term):
+        doc_id = self.documents.get(term)
+        if doc_id is not None:
+            self.references[doc_id] += 1
+            return
+
+        grams = trigrams(term[1])
+        if self.free_ids:
+            doc_id = self.free_ids.pop()
+            self.texts[doc_id] = term
+            self.doc_trigrams[doc_id] = grams
+            self.references[doc_id] = 1
+        else:
+            doc_id = len(self.texts)
+            self.texts.append(term)
+            self.doc_trigrams.append(grams)
+            self.references.append(1)
+        self.documents[term] = doc_id
+        for gram in grams:
+            self.postings[gram].add(doc_id)
+
+    def _release(self, term):
+        doc_id = self.documents[term]
+        self.references[doc_id] -= 1
+        if self.references[doc_id]:
+            return
+
+        for gram in self.doc_trigrams[doc_id]:
+            postings = self.postings[gram]
+            postings.discard(doc_id)
+            if not postings:
+                del self.postings[gram]
+        del self.documents[term]
+        self.texts[doc_id] = None
+        self.doc_trigrams[doc_id] = None
+        self.free_ids.append(doc_id)
+
+    def search(self, query, kinds=None, limit=5, min_similarity=MIN_SIMILARITY):
+        query_grams = trigrams(query)
+        # A match has to share at least `needed` trigrams with the query, so it must appear in one of the
+        # len - needed + 1 rarest postings; frequent trigrams like "ов " are never scanned
+        needed = max(1, math.ceil(min_similarity * len(query_grams)))
+        rarest = sorted((self.postings.get(gram, ()) for gram in query_grams), key=len)
+        candidates = set().union(*rarest[:len(query_grams) - needed + 1])
+
+        scored = []
+        for doc_id in candidates:
+            kind, text = self.texts[doc_id]
+            if kinds and kind not in kinds:
+                continue
+            count = len(query_grams & self.doc_trigrams[doc_id])
+            similarity = count / len(query_grams)
+            if similarity >= min_similarity:
+                # Ties are broken by Jaccard similarity, so shorter entries closer to the query come first
+                jaccard = count / (len(query_grams) + len(self.doc_trigrams[doc_id]) - count)
+                scored.append((similarity, jaccard, kind, text))
+        return [(similarity, kind, text) for similarity, _, kind, text in heapq.nlargest(limit, scored)]
@@ -0,0 +1,123 @@
+import argparse
+import os
+import random
+from html import escape
+
+from schedule_bot import WEEKDAYS
+
+
+TIME_SLOTS = [
+    "08:00-09:25", "09:35-11:00", "11:10-12:35", "13:00-14:25",
+    "14:35-16:00", "16:10-17:35", "17:45-19:10", "19:20-20:45",
+]
+SUBJECTS = [
+    "Высшая математика", "Экономическая теория", "История", "Философия", "Микроэкономика", "Макроэкономика",
+    "Статистика", "Бухгалтерский учет", "Маркетинг", "Менеджмент", "Информатика", "Правоведение",
+    "Мировая экономика", "Финансы и кредит", "Эконометрика", "Логистика", "Социология", "Психология",
+]
+LESSON_TYPES = ["лек", "пр", "сем", "лаб"]
+SURNAMES = [
+    "Иванов", "Петрова", "Сидоров", "Козлова", "Смирнов", "Кузнецова", "Попов", "Васильева", "Соколов",
+    "Михайлова", "Новиков", "Фёдорова", "Морозов", "Волкова", "Алексеев", "Лебедева", "Семёнов", "Егорова",
+]
+LANGUAGE_SUBJECT = "Иностранный язык"  # Rows with this subject are followed by one 3-cell row per subgroup
+WEEK_PATTERNS = ['all', 'odd', 'even', 'halves', 'ranges']
+
+
+def week_string(pattern, weeks, rng):
+    if pattern == 'all':
+        return f"1-{weeks}"
+    if pattern == 'odd':
+        return ','.join(str(week) for week in range(1, weeks + 1, 2))
+    if pattern == 'even':
+        return ','.join(str(week) for week in range(2, weeks + 1, 2))
+    if pattern == 'halves':
+        middle = weeks // 2
+        return f"1-{middle}" if rng.random() < 0.5 else f"{middle + 1}-{weeks}"
+    if pattern == 'ranges':
+        # Like "1-8, 10, 12-16": runs and single weeks with gaps for holidays and control weeks
+        parts = []
+        week = rng.randint(1, 3)
+        while week <= weeks:
+            end = min(weeks, week + rng.choice([0, 0, 1, 3, 5, 7]))
+            parts.append(str(week) if end == week else f"{week}-{end}")
+            week = end + rng.randint(2, 3)
+        return ', '.join(parts)
+    raise ValueError(f"Unknown week pattern '{pattern}', expected one of {', '.join(WEEK_PATTERNS)}")
+
+
+def teacher_name(rng):
+    return f"{rng.choice(SURNAMES)} {rng.choice('АБВГДЕИКЛМНОПРС')}.{rng.choice('АБВГДЕИКЛМНОПРС')}."
+
+
+def classroom(rng):
+    return f"{rng.randint(1, 9)}{rng.randint(0, 2)}{rng.randint(0, 9)}/{rng.randint(1, 5)}"
+
+
+def generate_schedule_html(days=len(WEEKDAYS), rows_per_day=4, subgroups=2, language_share=0.15,
+                           week_patterns=WEEK_PATTERNS, weeks=16, seed=None):
+    rng = random.Random(seed)
+    rows = []
+    for day_index in range(days):
+        # Days past Saturday repeat the week, which only makes sense for scaling runs
+        rows.append(f'<tr><td colspan="4">{WEEKDAYS[day_index % len(WEEKDAYS)]}</td></tr>')
+        slots = sorted(rng.randrange(len(TIME_SLOTS)) for _ in range(rows_per_day))
+        for slot in slots:
+            time_slot = TIME_SLOTS[slot]
+            weeks_info = week_string(rng.choice(week_patterns), weeks, rng)
+            if subgroups and rng.random() < language_share:
+                rows.append(
+                    f'<tr><td>{time_slot}</td><td>{weeks_info}</td><td>{LANGUAGE_SUBJECT} (пр)</td><td></td></tr>'
+                )
+                for subgroup in range(1, subgroups + 1):
+                    rows.append(
+                        f'<tr><td>{subgroup} подгр.</td><td>{escape(teacher_name(rng))}</td><td>{classroom(rng)}</td></tr>'
+                    )
+                continue
+            subject = f"{rng.choice(SUBJECTS)} ({rng.choice(LESSON_TYPES)})"
+            rows.append(
+                f'<tr><td>{time_slot}</td><td>{weeks_info}</td>'
+                f'<td>{escape(subject)}, {escape(teacher_name(rng))}</td><td>{classroom(rng)}</td></tr>'
+            )
+
+    table = '\n'.join(rows)
+    return f'<html><body><table id="sched">\n{table}\n</table></body></html>'
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate schedule pages shaped like the university website's")
+    parser.add_argument('out', help="Output file, or directory when --groups is given")
+    parser.add_argument('--groups', type=int, help="Write this many pages named <group>.html into the directory")
+    parser.add_argument('--first-group', type=int, default=9499)
+    parser.add_argument('--days', type=int, default=len(WEEKDAYS))
+    parser.add_argument('--rows-per-day', type=int, default=4)
+    parser.add_argument('--subgroups', type=int, default=2)
+    parser.add_argument('--language-share', type=float, default=0.15)
+    parser.add_argument('--week-patterns', default=','.join(WEEK_PATTERNS))
+    parser.add_argument('--weeks', type=int, default=16)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    options = {
+        'days': args.days,
+        'rows_per_day': args.rows_per_day,
+        'subgroups': args.subgroups,
+        'language_share': args.language_share,
+        'week_patterns': args.week_patterns.split(','),
+        'weeks': args.weeks,
+    }
+    if args.groups is None:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            f.write(generate_schedule_html(seed=args.seed, **options))
+        return
+
+    os.makedirs(args.out, exist_ok=True)
+    for i in range(args.groups):
+        group = args.first_group + i
+        with open(os.path.join(args.out, f"{group}.html"), 'w', encoding='utf-8') as f:
+            # Every page has its own seed, so a page does not depend on how many were generated
+            f.write(generate_schedule_html(seed=f"{args.seed}:{group}", **options))
+
+
+if __name__ == '__main__':
+    main()
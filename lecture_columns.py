@@ -0,0 +1,225 @@
+import threading
+from array import array
+
+from schedule_store import week_lecture_info
+
+
+NO_MINUTE = -1  # Start or end of a lecture whose time slot could not be parsed
+MIN_CAPACITY = 1024  # Rows allocated for an empty store
+GROWTH_FACTOR = 1.5  # Arrays grow geometrically, so filling the store group by group stays linear
+COMPACT_MIN_DEAD_ROWS = 4096  # Dead rows are only compacted away once there are this many and more than live ones
+# Column -> array type code: dictionary IDs for strings and week masks, minutes since midnight for times
+COLUMNS = {
+    'day': 'I',
+    'time': 'I',
+    'subgroup': 'I',
+    'subject': 'I',
+    'teacher': 'I',
+    'room': 'I',
+    'weeks': 'I',
+    'start': 'h',
+    'end': 'h',
+}
+
+
+class Dictionary:
+    # Value <-> integer ID. IDs are never reused, so every generation of the columns decodes with the same table
+    def __init__(self):
+        self.values = []
+        self.ids = {}
+
+    def encode(self, value):
+        value_id = self.ids.get(value)
+        if value_id is None:
+            value_id = self.ids[value] = len(self.values)
+            self.values.append(value)
+        return value_id
+
+    def __len__(self):
+        return len(self.values)
+
+
+class LectureColumns:
+    # One immutable generation of the store. Rows [0, size) of the column arrays never change once published,
+    # rows past size are spare capacity the next generation appends to. A replaced group leaves dead rows
+    # behind until a compaction copies the live ones into new arrays
+    def __init__(self, columns, size, groups, dead=0):
+        self.columns = columns  # column -> array
+        self.size = size  # rows written
+        self.groups = groups  # group -> (start, stop, {day: (start, stop)}) row ranges, each day contiguous
+        self.dead = dead  # rows of replaced groups
+
+
+class LectureView:
+    # Rows start:stop of one generation as memoryview slices of its columns, nothing is copied
+    def __init__(self, store, columns, start, stop):
+        self.store = store
+        self.columns = {name: memoryview(column)[start:stop] for name, column in columns.columns.items()}
+
+    def __len__(self):
+        return len(self.columns['day'])
+
+    def rows(self, week=None):
+        # -> (day, time, start, end, subgroup, subject, teacher, room, week mask) in page order,
+        # only the lectures taking place in `week` when it is given
+        dictionaries = self.store.dictionaries
+        masks = dictionaries['weeks'].values
+        in_week = None if week is None else self.store.masks_in_week(week)
+        columns = self.columns
+        for i, mask_id in enumerate(columns['weeks']):
+            if in_week is not None and mask_id not in in_week:
+                continue
+            start, end = columns['start'][i], columns['end'][i]
+            yield (
+                dictionaries['day'].values[columns['day'][i]],
+                dictionaries['time'].values[columns['time'][i]],
+                None if start == NO_MINUTE else start,
+                None if end == NO_MINUTE else end,
+                dictionaries['subgroup'].values[columns['subgroup'][i]],
+                dictionaries['subject'].values[columns['subject'][i]],
+                dictionaries['teacher'].values[columns['teacher'][i]],
+                dictionaries['room'].values[columns['room'][i]],
+                masks[mask_id],
+            )
+
+
+class ColumnarLectureStore:
+    # Lectures of every group in dictionary-encoded columns: a lecture costs a few dozen bytes instead of a dict
+    # of strings. An update builds the next generation and swaps it in, readers never take a lock
+    def __init__(self):
+        self.dictionaries = {name: Dictionary() for name in COLUMNS if name not in ('start', 'end')}
+        self.generation = LectureColumns({name: array(typecode) for name, typecode in COLUMNS.items()}, 0, {})
+        self.lock = threading.Lock()  # Serialises writers
+        self.week_masks = {}  # week -> (size of the mask dictionary, IDs of the masks including the week)
+        self.week_limit = (0, 0)  # (masks looked at, 1 + highest week any of them includes)
+
+    def encode(self, lectures):
+        # Stable by first appearance of the day, so every day of the group is one contiguous range
+        day_order = {}
+        for lecture in lectures:
+            day_order.setdefault(lecture['Day'], len(day_order))
+        lectures = sorted(lectures, key=lambda lecture: day_order[lecture['Day']])
+
+        dictionaries = self.dictionaries
+        encoded = {name: array(typecode) for name, typecode in COLUMNS.items()}
+        for lecture in lectures:
+            encoded['day'].append(dictionaries['day'].encode(lecture['Day']))
+            encoded['time'].append(dictionaries['time'].encode(lecture['Time']))
+            encoded['subgroup'].append(dictionaries['subgroup'].encode(lecture['Subgroup']))
+            encoded['subject'].append(dictionaries['subject'].encode(lecture['Subject']))
+            encoded['teacher'].append(dictionaries['teacher'].encode(lecture['Teacher']))
+            encoded['room'].append(dictionaries['room'].encode(lecture['Classroom']))
+            encoded['weeks'].append(dictionaries['weeks'].encode(lecture['Weeks']))
+            encoded['start'].append(NO_MINUTE if lecture['Start'] is None else lecture['Start'])
+            encoded['end'].append(NO_MINUTE if lecture['End'] is None else lecture['End'])
+        return encoded, [lecture['Day'] for lecture in lectures]
+
+    def update_group(self, group, lectures):
+        # lectures as extract_all_lectures returns them, None drops the group. The group's rows are appended,
+        # copying only when the arrays are full or mostly dead, so an update costs about its own rows
+        with self.lock:
+            encoded, days = self.encode(lectures or [])
+            current = self.generation
+            groups = current.groups.copy()
+            columns, size, dead = current.columns, current.size, current.dead
+            replaced = groups.pop(group, None)
+            if replaced is not None:
+                dead += replaced[1] - replaced[0]
+            if dead >= COMPACT_MIN_DEAD_ROWS and dead > size - dead:
+                columns, size, groups = self.compacted(columns, groups, size - dead + len(days))
+                dead = 0
+
+            if lectures is not None:
+                columns = self.reserved(columns, size, size + len(days))
+                for name, values in encoded.items():
+                    # Same length, the arrays are written in place and memoryviews of readers stay valid
+                    columns[name][size:size + len(days)] = values
+                day_ranges = {}
+                for offset, day in enumerate(days):
+                    day_start, _ = day_ranges.get(day, (size + offset, None))
+                    day_ranges[day] = (day_start, size + offset + 1)
+                groups[group] = (size, size + len(days), day_ranges)
+                size += len(days)
+            self.generation = LectureColumns(columns, size, groups, dead)
+
+    @staticmethod
+    def reserved(columns, size, needed):
+        # -> columns with room for `needed` rows, new arrays holding the first `size` rows when they are too short
+        if len(columns['day']) >= needed:
+            return columns
+        capacity = max(MIN_CAPACITY, int(needed * GROWTH_FACTOR))
+        return {name: column[:size] + array(column.typecode, [0]) * (capacity - size)
+                for name, column in columns.items()}
+
+    @staticmethod
+    def compacted(columns, groups, needed):
+        # -> (new columns, rows written, groups) holding only the rows of `groups`, with room for `needed` rows
+        capacity = max(MIN_CAPACITY, int(needed * GROWTH_FACTOR))
+        packed = {name: array(column.typecode) for name, column in columns.items()}
+        moved = {}
+        for group, (start, stop, day_ranges) in groups.items():
+            shift = len(packed['day']) - start
+            for name, column in columns.items():
+                packed[name] += column[start:stop]
+            moved[group] = (start + shift, stop + shift, {
+                day: (day_start + shift, day_stop + shift) for day, (day_start, day_stop) in day_ranges.items()
+            })
+        size = len(packed['day'])
+        for column in packed.values():
+            column.extend(array(column.typecode, [0]) * max(0, capacity - size))
+        return packed, size, moved
+
+    def masks_in_week(self, week):
+        masks = self.dictionaries['weeks'].values
+        count = len(masks)
+        seen, limit = self.week_limit
+        if seen != count:
+            limit = max([limit] + [masks[mask_id].bit_length() for mask_id in range(seen, count)])
+            self.week_limit = (count, limit)
+        if not 0 <= week < limit:
+            return frozenset()  # No mask includes the week, any number can be asked for so it is not cached
+        cached = self.week_masks.get(week)
+        if cached is None or cached[0] != count:
+            # Masks are only appended, IDs below the cached size keep their answer
+            known, mask_ids = cached or (0, frozenset())
+            mask_ids = mask_ids | {mask_id for mask_id in range(known, count) if masks[mask_id] >> week & 1}
+            cached = self.week_masks[week] = (count, mask_ids)
+        return cached[1]
+
+    def view(self, group, day=None):
+        # Zero-copy view of the group's lectures, or of one day of them; None for an unknown group or day
+        generation = self.generation
+        entry = generation.groups.get(group)
+        if entry is None:
+            return None
+        start, stop, day_ranges = entry
+        if day is not None:
+            if day not in day_ranges:
+                return None
+            start, stop = day_ranges[day]
+        return LectureView(self, generation, start, stop)
+
+    def lectures(self, group):
+        # Decoded like extract_all_lectures records, day by day
+        view = self.view(group)
+        return [{
+            'Day': day,
+            'Weeks': weeks,
+            'Subgroup': subgroup,
+            'Time': time_slot,
+            'Start': start,
+            'End': end,
+            'Subject': subject,
+            'Teacher': teacher,
+            'Classroom': room,
+        } for day, time_slot, start, end, subgroup, subject, teacher, room, weeks in (view.rows() if view else ())]
+
+    def lecture_info(self, group, week, subgroup, sub_subgroup):
+        # Same result as extract_lecture_info on the group's page
+        view = self.view(group)
+        return week_lecture_info((row[:8] for row in (view.rows(week) if view else ())), subgroup, sub_subgroup)
+
+    def __len__(self):
+        # Live rows, spare capacity and dead rows of replaced groups excluded
+        generation = self.generation
+        return generation.size - generation.dead
@@ -0,0 +1,89 @@
+import argparse
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from telebot import apihelper
+
+from academic_calendar import AcademicCalendar
+from broadcast import parse_digest_time
+from fake_schedule_site import FakeScheduleSite
+from fake_telegram_api import FakeTelegramApi
+from generate_schedule_html import generate_schedule_html
+from logging_setup import setup_logging
+from schedule_bot import ScheduleBot, ScheduleBotAction, DEFAULT_GROUP, WEEKDAYS
+
+
+LOAD_TEXTS = [
+    ScheduleBotAction.TODAY, ScheduleBotAction.TOMORROW, ScheduleBotAction.CURRENT_WEEK, ScheduleBotAction.NEXT_WEEK,
+    ScheduleBotAction.NOW, ScheduleBotAction.NEXT_LECTURE, "/start", "/find Иванов", "/teacher Петрова", *WEEKDAYS,
+]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else float('nan')
+
+
+def start_bot_stack(latency, rows_per_day, timeout):
+    # -> (bot, fake API) with the bot polling the fake API and its schedule loaded from the fake site
+    # The bot's files go to a temporary directory, a load run must not touch the real ones
+    work_dir = tempfile.mkdtemp(prefix="schedule_bot_load_")
+    pages_dir = os.path.join(work_dir, 'pages')
+    os.makedirs(pages_dir)
+    with open(os.path.join(pages_dir, f"{DEFAULT_GROUP}.html"), 'w', encoding='utf-8') as f:
+        f.write(generate_schedule_html(rows_per_day=rows_per_day, seed=0))
+
+    site_server = FakeScheduleSite(pages_dir).serve(port=0)
+    threading.Thread(target=site_server.serve_forever, daemon=True).start()
+    api = FakeTelegramApi(latency)
+    api_server = api.serve(port=0)
+    threading.Thread(target=api_server.serve_forever, daemon=True).start()
+    apihelper.API_URL = f"http://127.0.0.1:{api_server.server_port}/bot{{0}}/{{1}}"
+
+    bot = ScheduleBot(
+        "123456:load", f"http://127.0.0.1:{site_server.server_port}/", "1 подгр", "1 подгр",
+        parse_digest_time("20:00"), AcademicCalendar(), data_dir=work_dir
+    )
+    threading.Thread(target=bot.run, name="bot", daemon=True).start()
+    if not bot.ready.wait(timeout):
+        raise SystemExit("The bot did not load its schedule")
+    return bot, api
+
+
+def report(api, expected, completed):
+    latencies = list(api.latencies)
+    elapsed = (api.last_reply_at or time.perf_counter()) - api.first_injected_at
+    print(f"Answered {len(latencies)} of {expected} updates in {elapsed:.2f}s "
+          f"({len(latencies) / elapsed:.1f} updates/s)" + ("" if completed else ", timed out"))
+    for label, q in (('p50', 0.5), ('p95', 0.95), ('p99', 0.99), ('max', 1.0)):
+        print(f"  {label}: {percentile(latencies, q) * 1000:8.1f} ms")
+    print(f"  API calls: {dict(api.calls)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure ScheduleBot end to end against local Telegram and website stand-ins")
+    parser.add_argument('--updates', type=int, default=2000)
+    parser.add_argument('--rate', type=float, default=200, help="Injected updates per second")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds the fake Bot API adds to every call")
+    parser.add_argument('--rows-per-day', type=int, default=4, help="Size of the generated schedule page")
+    parser.add_argument('--timeout', type=float, default=120, help="Seconds to wait for the last reply")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    _, api = start_bot_stack(args.latency, args.rows_per_day, args.timeout)
+
+    print(f"Injecting {args.updates} updates at {args.rate:.0f}/s with {args.latency * 1000:.0f} ms API latency")
+    api.inject_many(LOAD_TEXTS, args.updates, args.rate)
+    completed = api.wait_for_replies(args.updates, args.timeout)
+    report(api, args.updates, completed)
+    logging.shutdown()
+    if not completed:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+import atexit
+import logging
+import queue
+import random
+import sys
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+LOG_QUEUE_SIZE = 10000  # Records waiting for the listener thread; beyond that new records are dropped
+MESSAGE_LOG_SAMPLE_RATE = 1.0  # Share of per-message INFO lines written
+MESSAGE_LOGGER = "schedule_bot.messages"  # Logger of the per-message lines, the only one being sampled
+
+# Attributes every LogRecord has, anything else was passed in `extra` and is printed as a field
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+
+class FieldsFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = [f"{name}={value}" for name, value in vars(record).items() if name not in RECORD_ATTRIBUTES]
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class LazyQueueHandler(QueueHandler):
+    # The stock handler formats the message on the calling thread; the arguments logged here are plain
+    # strings and numbers, so the record is queued as is and formatted by the listener
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass  # A stalled log sink must not block the handlers answering users
+
+
+def setup_logging(level=logging.INFO, message_sample_rate=MESSAGE_LOG_SAMPLE_RATE):
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(FieldsFormatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    listener = QueueListener(log_queue, handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    root.handlers = [LazyQueueHandler(log_queue)]
+    root.setLevel(level)
+    if message_sample_rate < 1:
+        logging.getLogger(MESSAGE_LOGGER).addFilter(SamplingFilter(message_sample_rate))
+
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
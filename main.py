@@ -1,7 +1,27 @@
+from startup_profile import StartupProfiler
 import logging
+import time
+import tracemalloc
 from dotenv import load_dotenv
 import os
-from schedule_bot import ScheduleBot
+from schedule_bot import ScheduleBot, DEFAULT_GROUP_FORM, parse_group_forms
+from broadcast import parse_digest_time
+from academic_calendar import AcademicCalendar
+from logging_setup import setup_logging, MESSAGE_LOG_SAMPLE_RATE
+from metrics import REGISTRY
+from update_recorder import UpdateRecorder
+from tracing import TRACER, TRACE_SAMPLE_RATE, TRACE_SLOW_SECONDS
+from memory_profile import MemoryMonitor, MEMORY_PROFILE_FRAMES
+
+def load_log_settings():
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise ValueError(f"LOG_LEVEL must be a logging level name, got {level!r}")
+    sample_rate = os.environ.get("LOG_MESSAGE_SAMPLE_RATE", str(MESSAGE_LOG_SAMPLE_RATE))
+    try:
+        return level, float(sample_rate)
+    except ValueError:
+        raise ValueError(f"LOG_MESSAGE_SAMPLE_RATE must be a number, got {sample_rate!r}")
 
 def load_api_credentials():
     logging.info("Starting to load API credentials")
@@ -21,11 +41,67 @@ def load_api_credentials():
 
     return telegram_bot_token, website_url, subgroup, sub_subgroup
 
+def load_digest_time():
+    return parse_digest_time(os.environ.get("DIGEST_TIME", "20:00"))
+
+def load_group_forms():
+    group_forms = parse_group_forms(os.environ.get("GROUPS"))
+    if not any(group_form['group'] == DEFAULT_GROUP_FORM['group'] for group_form in group_forms):
+        group_forms.insert(0, DEFAULT_GROUP_FORM)
+    return group_forms
+
+def load_calendar():
+    return AcademicCalendar.from_config(
+        os.environ.get("SEMESTER_STARTS"),
+        os.environ.get("HOLIDAYS"),
+        os.environ.get("TRANSFERS")
+    )
+
+def load_admin_ids():
+    admin_ids = os.environ.get("ADMIN_IDS", "")
+    try:
+        return {int(admin_id) for admin_id in admin_ids.split(",") if admin_id.strip()}
+    except ValueError:
+        raise ValueError(f"ADMIN_IDS must be comma separated Telegram user IDs, got {admin_ids!r}")
+
 def main():
+    profiler = StartupProfiler()
+    profiler.add('imports', time.perf_counter() - profiler.started_at)
     try:
-        telegram_bot_token, website_url, subgroup, sub_subgroup = load_api_credentials()
+        with profiler.phase('config'):
+            # Until the settings are valid nothing is set up, a bad one is reported through the default handler
+            setup_logging(*load_log_settings())
+            telegram_bot_token, website_url, subgroup, sub_subgroup = load_api_credentials()
+
+            digest_time = load_digest_time()
+            calendar = load_calendar()
+            group_forms = load_group_forms()
+            admin_ids = load_admin_ids()
+            memory_profile_interval = float(os.environ.get("MEMORY_PROFILE_INTERVAL", 0))
+            if memory_profile_interval:
+                # Started before the bot loads anything, so its snapshots and schedules are traced too
+                tracemalloc.start(MEMORY_PROFILE_FRAMES)
+            crawl_catalog = os.environ.get("CRAWL_CATALOG", "").lower() in ("1", "true", "yes")
+            update_log_path = os.environ.get("UPDATE_LOG_PATH")
+            update_recorder = UpdateRecorder(update_log_path, os.environ.get("UPDATE_LOG_SALT")) if update_log_path else None
+
+        schedule_bot = ScheduleBot(
+            telegram_bot_token, website_url, subgroup, sub_subgroup, digest_time, calendar, group_forms,
+            crawl_catalog, profiler, update_recorder, admin_ids, os.environ.get("SCHEDULE_SNAPSHOT_PATH")
+        )
+
+        TRACER.configure(
+            os.environ.get("TRACE_PATH"),
+            float(os.environ.get("TRACE_SAMPLE_RATE", TRACE_SAMPLE_RATE)),
+            float(os.environ.get("TRACE_SLOW_SECONDS", TRACE_SLOW_SECONDS))
+        )
+
+        if memory_profile_interval:
+            MemoryMonitor(schedule_bot.memory_components(), memory_profile_interval).start()
 
-        schedule_bot = ScheduleBot(telegram_bot_token, website_url, subgroup, sub_subgroup)
+        metrics_port = os.environ.get("METRICS_PORT")
+        if metrics_port:
+            REGISTRY.serve(port=int(metrics_port))
 
         schedule_bot.run()
     except (ValueError, RuntimeError) as e:
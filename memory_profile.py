@@ -0,0 +1,116 @@
+import gc
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+
+MEMORY_PROFILE_FRAMES = 10  # Traceback depth recorded per allocation, deeper costs more memory and time
+MEMORY_PROFILE_TOP = 10  # Allocation sites listed per report
+
+
+def deep_sizeof(root):
+    # Bytes of root and everything reachable from it through containers, __dict__ and __slots__, each object once
+    seen = set()
+    stack = [root]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, (type, type(sys), type(deep_sizeof))):
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        try:
+            # Other threads keep writing, copies of their containers are taken atomically under the GIL
+            if isinstance(obj, dict):
+                items = obj.copy()
+                stack.extend(items.keys())
+                stack.extend(items.values())
+            elif isinstance(obj, (list, tuple, set, frozenset)):
+                stack.extend(obj.copy() if isinstance(obj, (list, set)) else obj)
+            else:
+                attributes = getattr(obj, '__dict__', None)
+                if attributes is not None:
+                    stack.append(attributes)
+                for slot in getattr(type(obj), '__slots__', ()):
+                    if hasattr(obj, slot):
+                        stack.append(getattr(obj, slot))
+        except RuntimeError:
+            continue
+    return size
+
+
+class MemoryMonitor:
+    # Diagnostic mode: every `interval` seconds takes a tracemalloc snapshot and sizes the bot's caches and
+    # per-user state, logging the top allocation sites and what grew per hour since the monitor started.
+    # Grouping a large heap's traces takes seconds of pure Python, keep the interval in minutes
+    def __init__(self, components, interval, top=MEMORY_PROFILE_TOP, frames=MEMORY_PROFILE_FRAMES):
+        self.components = components  # name -> callable returning the objects the component keeps
+        self.interval = interval
+        self.top = top
+        self.frames = frames
+        self.stop_event = threading.Event()
+        self.first = None  # (monotonic time, tracemalloc snapshot, component sizes) of the first report
+        self.sizes = {}  # component -> bytes at the latest report
+
+    def component_sizes(self):
+        sizes = {}
+        for name, read in self.components.items():
+            try:
+                sizes[name] = deep_sizeof(read())
+            except Exception as e:
+                logging.error(f"Failed to size {name}: {e}")
+        return sizes
+
+    def report(self):
+        gc.collect()
+        now = time.monotonic()
+        snapshot = tracemalloc.take_snapshot()
+        sizes = self.sizes = self.component_sizes()
+        if self.first is None:
+            self.first = now, snapshot, sizes
+
+        started_at, first_snapshot, first_sizes = self.first
+        hours = max(now - started_at, 1) / 3600
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Traced memory {current / 2 ** 20:.1f} MiB, peak {peak / 2 ** 20:.1f} MiB, "
+                 f"after {(now - started_at) / 3600:.2f} h"]
+
+        lines.append("Components (bytes, growth per hour):")
+        for name, size in sorted(sizes.items(), key=lambda item: -item[1]):
+            growth = (size - first_sizes.get(name, size)) / hours
+            lines.append(f"  {name}: {size / 1024:.0f} KiB, {growth / 1024:+.0f} KiB/h")
+
+        lines.append("Top allocation sites:")
+        for stat in snapshot.statistics('lineno')[:self.top]:
+            lines.append(f"  {stat.size / 1024:8.0f} KiB {stat.count:7} blocks  {stat.traceback[0]}")
+
+        if snapshot is not first_snapshot:
+            lines.append("Top growth since the first report (per hour):")
+            for stat in snapshot.compare_to(first_snapshot, 'traceback')[:self.top]:
+                if stat.size_diff <= 0:
+                    break
+                frames = ' <- '.join(str(frame) for frame in reversed(stat.traceback[-3:]))  # Innermost first
+                lines.append(f"  {stat.size_diff / hours / 1024:+8.0f} KiB/h  {frames}")
+
+        logging.info('\n'.join(lines))
+
+    def _run(self):
+        while True:
+            try:
+                self.report()
+            except Exception as e:
+                logging.error(f"Memory report failed: {e}")
+            if self.stop_event.wait(self.interval):
+                return
+
+    def start(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+        threading.Thread(target=self._run, name="memory-monitor", daemon=True).start()
+        logging.info(f"Memory profiling on, reports every {self.interval:.0f}s")
+
+    def stop(self):
+        self.stop_event.set()
+        tracemalloc.stop()
@@ -0,0 +1,271 @@
+import logging
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)  # Seconds
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+class ShardedMetric:
+    # Every thread writes to its own shard without taking a lock, a scrape adds the shards up
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.local = threading.local()
+        self.shards = []
+        self.lock = threading.Lock()  # Only taken when a thread writes for the first time and on scrape
+
+    def _shard(self):
+        try:
+            return self.local.shard
+        except AttributeError:
+            shard = self.local.shard = {}
+            with self.lock:
+                self.shards.append(shard)
+            return shard
+
+    def _snapshots(self):
+        with self.lock:
+            shards = list(self.shards)
+        # Copying a dict is atomic under the GIL, values of a shard being written may be a single update behind
+        return [dict(shard) for shard in shards]
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(ShardedMetric):
+    kind = 'counter'
+
+    def inc(self, *label_values, amount=1):
+        shard = self._shard()
+        shard[label_values] = shard.get(label_values, 0) + amount
+
+    def values(self):
+        totals = {}
+        for shard in self._snapshots():
+            for label_values, value in shard.items():
+                totals[label_values] = totals.get(label_values, 0) + value
+        return totals
+
+    def samples(self):
+        return [f"{self.name}{format_labels(self.labels, label_values)} {value}"
+                for label_values, value in sorted(self.values().items())]
+
+
+class Histogram(ShardedMetric):
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *label_values):
+        shard = self._shard()
+        counts = shard.get(label_values)
+        if counts is None:
+            # One count per bucket, then +Inf, then the sum
+            counts = shard[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    @contextmanager
+    def time(self, *label_values):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *label_values)
+
+    def values(self):
+        totals = {}
+        for shard in self._snapshots():
+            for label_values, counts in shard.items():
+                total = totals.setdefault(label_values, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        return totals
+
+    def merged(self, *label_values):
+        # Counts of every series whose labels start with label_values, all series without any
+        merged = None
+        for series, counts in self.values().items():
+            if series[:len(label_values)] != label_values:
+                continue
+            if merged is None:
+                merged = list(counts)
+            else:
+                for i, count in enumerate(counts):
+                    merged[i] += count
+        return merged
+
+    def count(self, *label_values):
+        counts = self.merged(*label_values)
+        return sum(counts[:-1]) if counts else 0
+
+    def quantile(self, q, *label_values):
+        # Upper bound of the bucket holding the q-th observation, None without observations
+        counts = self.merged(*label_values)
+        if not counts or not sum(counts[:-1]):
+            return None
+        rank = q * sum(counts[:-1])
+        seen = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def samples(self):
+        samples = []
+        for label_values, counts in sorted(self.values().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts[:-1]):
+                cumulative += count
+                labels = format_labels(self.labels + ('le',), label_values + (bound,))
+                samples.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            samples.append(f"{self.name}_sum{labels} {counts[-1]}")
+            samples.append(f"{self.name}_count{labels} {cumulative}")
+        return samples
+
+
+class ActivityTracker:
+    # Last activity time per key, for "active in the last hour" figures. touch() is a plain dict store, no lock
+    def __init__(self, retention=24 * 60 * 60):
+        self.retention = retention
+        self.last_seen = {}
+
+    def touch(self, key):
+        self.last_seen[key] = time.time()
+
+    def active(self, windows):
+        # windows: {label: seconds} -> {label: keys seen within that many seconds}
+        now = time.time()
+        last_seen = self.last_seen.copy()
+        for key, seen in last_seen.items():
+            if now - seen > self.retention:
+                self.last_seen.pop(key, None)  # A key touched right now is only missed until its next touch
+        return {label: sum(1 for seen in last_seen.values() if now - seen <= seconds) for label, seconds in windows.items()}
+
+
+def resident_memory_bytes():
+    # Current RSS from /proc, the peak RSS where there is no /proc
+    try:
+        with open('/proc/self/status', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # Bytes on macOS, KiB elsewhere
+
+
+class CallbackMetric:
+    # Read from its owner on scrape: read() returns a number, or {label values: number}
+    def __init__(self, name, help, read, labels=(), kind='gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        value = self.read()
+        values = value if isinstance(value, dict) else {(): value}
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in sorted(values.items()):
+            if not isinstance(label_values, tuple):
+                label_values = (label_values,)
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            existing = self.metrics.get(metric.name)
+            if isinstance(existing, ShardedMetric) and type(existing) is type(metric):
+                return existing
+            # Callback metrics are replaced, they are bound to the object registering them
+            self.metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labels=()):
+        return self._register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read, labels=()):
+        return self._register(CallbackMetric(name, help, read, labels))
+
+    def callback_counter(self, name, help, read, labels=()):
+        return self._register(CallbackMetric(name, help, read, labels, kind='counter'))
+
+    def render(self):
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logging.error(f"Failed to collect metric {metric.name}: {e}")
+        return '\n'.join(lines) + '\n'
+
+    def serve(self, host='127.0.0.1', port=9100):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                payload = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        logging.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+        return server
+
+
+REGISTRY = Registry()
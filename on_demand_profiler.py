@@ -0,0 +1,194 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+
+PROFILE_DIR = "profiles"  # Where stats files of finished sessions are written
+PROFILE_TOP = 15  # Functions listed in a session summary
+SAMPLE_INTERVAL_SECONDS = 0.005  # Pause between two stack samples of the sampling profiler
+MAX_PROFILE_SECONDS = 600  # A forgotten session still ends
+# Leaf functions of threads parked on a queue, lock, timer or socket; their samples say nothing about CPU time
+IDLE_FUNCTIONS = {'wait', 'get', 'sleep', 'select', 'poll', 'accept', 'readinto', 'recv_into', '_wait_for_tstate_lock'}
+
+
+def parse_profile_request(arguments):
+    # "/profile [cprofile|sample] [30s|100u|100]" -> (mode, seconds, updates), a bare number counts seconds
+    mode, seconds, updates = 'sample', 30, None
+    for argument in arguments:
+        argument = argument.lower()
+        if argument in ('cprofile', 'sample'):
+            mode = argument
+        elif argument[:-1].isdigit() and argument[-1] in 'su':
+            seconds, updates = (int(argument[:-1]), None) if argument[-1] == 's' else (None, int(argument[:-1]))
+        elif argument.isdigit():
+            seconds, updates = int(argument), None
+        else:
+            return None
+    if (seconds is not None and not 0 < seconds <= MAX_PROFILE_SECONDS) or (updates is not None and updates <= 0):
+        return None
+    return mode, seconds, updates
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class ProfileSession:
+    def __init__(self, mode, seconds, updates, on_done):
+        self.mode = mode
+        self.seconds = seconds
+        self.max_updates = updates
+        self.on_done = on_done  # on_done(summary, stats_path)
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + (seconds or MAX_PROFILE_SECONDS)
+        self.stats = None  # pstats.Stats of every profiled update, cProfile mode
+        self.stacks = Counter()  # sampled stack -> samples, sampling mode
+        self.samples = 0
+        self.updates = 0
+        self.done = threading.Event()
+
+
+class OnDemandProfiler:
+    # Off, the per-update cost is a single attribute check
+    def __init__(self, profile_dir=PROFILE_DIR):
+        self.profile_dir = profile_dir
+        self.session = None
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def start(self, mode, seconds=None, updates=None, on_done=None):
+        with self.lock:
+            if self.session is not None:
+                return False
+            session = self.session = ProfileSession(mode, seconds, updates, on_done)
+        if mode == 'sample':
+            threading.Thread(target=self._sample, args=(session,), name="profile-sampler", daemon=True).start()
+        threading.Thread(target=self._expire, args=(session,), name="profile-timer", daemon=True).start()
+        limit = f"{seconds} seconds" if seconds else f"{updates} updates"
+        logging.info(f"Profiling started: {mode} for {limit}")
+        return True
+
+    @contextmanager
+    def update(self):
+        session = self.session
+        if session is None or getattr(self.local, 'profiling', False):
+            yield
+            return
+
+        profile = None
+        if session.mode == 'cprofile':
+            # cProfile only sees the thread it is enabled in, so every handled update gets its own profile
+            profile = cProfile.Profile()
+            profile.enable()
+            self.local.profiling = True
+        try:
+            yield
+        finally:
+            if profile is not None:
+                profile.disable()
+                self.local.profiling = False
+            self._count_update(session, profile)
+
+    def _count_update(self, session, profile):
+        with self.lock:
+            if self.session is not session:
+                return
+            if profile is not None:
+                if session.stats is None:
+                    session.stats = pstats.Stats(profile)
+                else:
+                    session.stats.add(profile)
+            session.updates += 1
+            finished = session.max_updates is not None and session.updates >= session.max_updates
+        if finished:
+            self._finish(session)
+
+    def _sample(self, session):
+        own_id = threading.get_ident()
+        names = {}
+        while not session.done.is_set():
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_name in IDLE_FUNCTIONS:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame))
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                session.stacks[tuple(reversed(stack))] += 1
+            session.samples += 1
+            session.done.wait(SAMPLE_INTERVAL_SECONDS)
+
+    def _expire(self, session):
+        if not session.done.wait(session.deadline - time.monotonic()):
+            self._finish(session)
+
+    def _finish(self, session):
+        with self.lock:
+            if self.session is not session:
+                return
+            self.session = None
+        session.done.set()
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        name = datetime.now().strftime('%Y%m%d-%H%M%S')
+        elapsed = time.monotonic() - session.started_at
+        header = f"{session.mode} profile: {elapsed:.1f}s, {session.updates} updates"
+        if session.mode == 'cprofile':
+            stats_path = os.path.join(self.profile_dir, f"{name}.prof")
+            if session.stats is None:
+                summary, stats_path = f"{header}, nothing was profiled", None
+            else:
+                session.stats.dump_stats(stats_path)
+                output = io.StringIO()
+                session.stats.stream = output
+                session.stats.sort_stats('cumulative').print_stats(PROFILE_TOP)
+                summary = f"{header}\n{self._strip_pstats(output.getvalue())}"
+        else:
+            stats_path = os.path.join(self.profile_dir, f"{name}.folded")
+            # Collapsed stacks, the input format of flamegraph.pl and speedscope
+            with open(stats_path, 'w', encoding='utf-8') as f:
+                for stack, count in session.stacks.most_common():
+                    f.write(f"{';'.join(stack)} {count}\n")
+            summary = f"{header}, {session.samples} samples\n{self._sample_summary(session.stacks)}"
+
+        logging.info(f"Profiling finished, stats in {stats_path}\n{summary}")
+        if session.on_done:
+            try:
+                session.on_done(summary, stats_path)
+            except Exception as e:
+                logging.error(f"Failed to deliver the profile: {e}")
+
+    @staticmethod
+    def _strip_pstats(text):
+        # Drops the banner pstats prints before the table
+        lines = text.strip().splitlines()
+        for i, line in enumerate(lines):
+            if line.lstrip().startswith('ncalls'):
+                return '\n'.join(lines[i:])
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _sample_summary(stacks):
+        own = Counter()
+        total = Counter()
+        for stack, count in stacks.items():
+            own[stack[-1]] += count
+            for label in set(stack[1:]):
+                total[label] += count
+        samples = sum(stacks.values()) or 1
+        lines = ["  own  total  function"]
+        for label, count in own.most_common(PROFILE_TOP):
+            lines.append(f"{count / samples:5.0%} {total[label] / samples:6.0%}  {label}")
+        return '\n'.join(lines)
@@ -0,0 +1,50 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+
+
+PREFETCH_LEAD = timedelta(hours=6)  # How long before Monday 00:00 the upcoming week is prepared
+PREFETCH_REFRESH_TIMEOUT = 10 * 60  # Seconds the prefetch waits for its refresh before warming the cached schedule
+
+
+class WeekBoundaryPrefetcher:
+    def __init__(self, prefetch, lead=PREFETCH_LEAD):
+        self.prefetch = prefetch  # prefetch(boundary) prepares everything needed after `boundary`
+        self.lead = lead
+        self.stop_event = threading.Event()
+        self.last_boundary = None
+
+    @staticmethod
+    def next_boundary(now):
+        monday = datetime.combine(now.date() - timedelta(days=now.weekday()), datetime.min.time())
+        return monday + timedelta(days=7)
+
+    def start(self):
+        threading.Thread(target=self._loop, name="week-prefetcher", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            now = datetime.now()
+            boundary = self.next_boundary(now)
+            run_at = boundary - self.lead
+            if boundary == self.last_boundary:
+                run_at = boundary
+            elif run_at <= now:
+                # Started inside the lead window, the spike is still ahead of us
+                self._run(boundary)
+                continue
+            if self.stop_event.wait((run_at - now).total_seconds()):
+                return
+            if boundary != self.last_boundary:
+                self._run(boundary)
+
+    def _run(self, boundary):
+        self.last_boundary = boundary
+        logging.info(f"Prefetching schedules for the week starting {boundary.date().isoformat()}")
+        try:
+            self.prefetch(boundary)
+        except Exception as e:
+            logging.error(f"Week prefetch failed: {e}")
@@ -0,0 +1,230 @@
+import heapq
+import logging
+import threading
+import time
+
+
+REFRESH_BUDGET_PER_MINUTE = 20  # Global limit of schedule fetches per minute
+REFRESH_WORKERS = 2  # Fetches running at the same time
+BASE_REFRESH_INTERVAL = 6 * 60 * 60  # Interval of a group nobody asks for, with an average change history
+MIN_REFRESH_INTERVAL = 10 * 60  # Even the most popular group is not refreshed more often
+MAX_REFRESH_INTERVAL = 24 * 60 * 60  # Even a forgotten group is refreshed at least daily
+REQUEST_HALF_LIFE = 60 * 60  # Requests lose half of their weight every hour
+CHANGE_SMOOTHING = 0.3  # Weight of the latest refresh outcome in the change rate
+CHANGE_FLOOR = 0.5  # Keeps groups that never change from drifting to the maximum interval too fast
+FRESHNESS_BUCKETS = [5 * 60, 15 * 60, 60 * 60, 6 * 60 * 60, 24 * 60 * 60]  # Upper bounds of schedule age buckets
+METRICS_LOG_INTERVAL = 10 * 60  # Seconds between refresh metrics log lines
+
+
+class GroupState:
+    __slots__ = ('requests', 'requests_at', 'change_rate', 'refreshed_at', 'next_due', 'refreshing', 'attempts',
+                 'last_succeeded')
+
+    def __init__(self, now):
+        self.requests = 0.0
+        self.requests_at = now
+        self.change_rate = 0.5
+        self.refreshed_at = now
+        self.next_due = now
+        self.refreshing = False
+        self.attempts = 0  # Finished refreshes, successful or not
+        self.last_succeeded = False  # Outcome of the latest one
+
+
+class RefreshScheduler:
+    def __init__(self, refresh, budget_per_minute=REFRESH_BUDGET_PER_MINUTE, workers=REFRESH_WORKERS):
+        self.refresh = refresh  # refresh(group) -> True when the fetched schedule differs from the cached one
+        self.budget_per_minute = budget_per_minute
+        self.workers = workers
+        self.groups = {}  # group -> GroupState
+        self.heap = []  # (next_due, group), outdated entries are skipped when popped
+        self.tokens = float(budget_per_minute)
+        self.tokens_at = time.monotonic()
+        self.condition = threading.Condition()
+        self.stop_event = threading.Event()
+        self.succeeded = 0
+        self.failed = 0
+        self.changed = 0
+
+    def add_group(self, group, refreshed_at=None):
+        with self.condition:
+            now = time.time()
+            state = self.groups.get(group)
+            if state is None:
+                state = self.groups[group] = GroupState(now)
+            state.refreshed_at = refreshed_at or now
+            self._schedule(group, state)
+
+    def record_request(self, group):
+        with self.condition:
+            state = self.groups.get(group)
+            if state is None:
+                return
+            now = time.time()
+            state.requests = self._decayed_requests(state, now) + 1
+            state.requests_at = now
+            # A group getting popular is pulled forward, a cooling one keeps its slot until it is refreshed
+            due = state.refreshed_at + self.interval(state, now)
+            if due < state.next_due and not state.refreshing:
+                state.next_due = due
+                heapq.heappush(self.heap, (due, group))
+                self.condition.notify()
+
+    def active_groups(self, min_requests=1.0):
+        with self.condition:
+            now = time.time()
+            return [group for group, state in self.groups.items() if self._decayed_requests(state, now) >= min_requests]
+
+    def expedite(self, groups):
+        # Make the groups due now; they are still fetched within the per-minute budget
+        with self.condition:
+            now = time.time()
+            for group in groups:
+                state = self.groups.get(group)
+                if state is not None and not state.refreshing and state.next_due > now:
+                    state.next_due = now
+                    heapq.heappush(self.heap, (now, group))
+            self.condition.notify_all()
+
+    def refresh_now(self, group, timeout=None):
+        # Run the group's refresh on a worker and wait for it -> True when it succeeded. A refresh already
+        # running counts, two workers never fetch the same group at once
+        with self.condition:
+            state = self.groups.get(group)
+            if state is None:
+                return False
+            target = state.attempts + 1
+            if not state.refreshing:
+                state.next_due = time.time()
+                heapq.heappush(self.heap, (state.next_due, group))
+                self.condition.notify_all()
+            self.condition.wait_for(lambda: state.attempts >= target or self.stop_event.is_set(), timeout)
+            return state.attempts >= target and state.last_succeeded
+
+    @staticmethod
+    def _decayed_requests(state, now):
+        return state.requests * 0.5 ** ((now - state.requests_at) / REQUEST_HALF_LIFE)
+
+    def interval(self, state, now):
+        popularity = 1 + self._decayed_requests(state, now)
+        interval = BASE_REFRESH_INTERVAL / (popularity * (CHANGE_FLOOR + state.change_rate))
+        return min(MAX_REFRESH_INTERVAL, max(MIN_REFRESH_INTERVAL, interval))
+
+    def _schedule(self, group, state):
+        state.next_due = state.refreshed_at + self.interval(state, time.time())
+        heapq.heappush(self.heap, (state.next_due, group))
+        self.condition.notify()
+
+    def _take_token(self):
+        now = time.monotonic()
+        self.tokens = min(self.budget_per_minute, self.tokens + (now - self.tokens_at) * self.budget_per_minute / 60)
+        self.tokens_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) * 60 / self.budget_per_minute
+
+    def _next_group(self):
+        with self.condition:
+            while not self.stop_event.is_set():
+                now = time.time()
+                while self.heap:
+                    due, group = self.heap[0]
+                    state = self.groups[group]
+                    if due != state.next_due or state.refreshing:
+                        heapq.heappop(self.heap)
+                        continue
+                    break
+
+                if not self.heap or self.heap[0][0] > now:
+                    self.condition.wait(self.heap[0][0] - now if self.heap else None)
+                    continue
+
+                wait = self._take_token()
+                if wait:
+                    self.condition.wait(wait)
+                    continue
+
+                _, group = heapq.heappop(self.heap)
+                self.groups[group].refreshing = True
+                return group
+        return None
+
+    def _worker(self):
+        while True:
+            group = self._next_group()
+            if group is None:
+                return
+            try:
+                changed = self.refresh(group)
+                success = True
+            except Exception as e:
+                logging.error(f"Failed to refresh group {group}: {e}")
+                changed = False
+                success = False
+
+            with self.condition:
+                state = self.groups[group]
+                state.refreshing = False
+                state.attempts += 1
+                state.last_succeeded = success
+                if success:
+                    self.succeeded += 1
+                    self.changed += changed
+                    state.refreshed_at = time.time()
+                    state.change_rate += CHANGE_SMOOTHING * (changed - state.change_rate)
+                else:
+                    self.failed += 1
+                self._schedule(group, state)
+                self.condition.notify_all()  # Wakes refresh_now callers
+
+    def _log_metrics(self):
+        while not self.stop_event.wait(METRICS_LOG_INTERVAL):
+            metrics = self.metrics()
+            logging.info(
+                f"Refresh queue depth {metrics['queue_depth']} of {metrics['groups']} groups, "
+                f"{metrics['succeeded']} refreshed ({metrics['changed']} changed), {metrics['failed']} failed, "
+                f"freshness {metrics['freshness']}"
+            )
+
+    def start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._worker, name=f"refresh-worker-{i}", daemon=True).start()
+        threading.Thread(target=self._log_metrics, name="refresh-metrics", daemon=True).start()
+        logging.info(f"Refresh scheduler started for {len(self.groups)} groups, budget {self.budget_per_minute} fetches/min")
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify_all()
+
+    def age(self, group):
+        with self.condition:
+            state = self.groups.get(group)
+            return None if state is None else time.time() - state.refreshed_at
+
+    def metrics(self):
+        with self.condition:
+            now = time.time()
+            queue_depth = sum(1 for state in self.groups.values() if state.next_due <= now and not state.refreshing)
+            freshness = {f"<={bound // 60}m": 0 for bound in FRESHNESS_BUCKETS}
+            freshness['older'] = 0
+            oldest_age = None
+            for state in self.groups.values():
+                age = now - state.refreshed_at
+                oldest_age = age if oldest_age is None else max(oldest_age, age)
+                for bound in FRESHNESS_BUCKETS:
+                    if age <= bound:
+                        freshness[f"<={bound // 60}m"] += 1
+                        break
+                else:
+                    freshness['older'] += 1
+            return {
+                'groups': len(self.groups),
+                'queue_depth': queue_depth,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'changed': self.changed,
+                'freshness': freshness,
+                'oldest_age': oldest_age,
+            }
@@ -0,0 +1,214 @@
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+
+REMINDER_HORIZON_DAYS = 2  # Reminders are planned for today and the following days up to this horizon
+REMINDER_SAVE_INTERVAL = 30  # Seconds between snapshots of pending reminders
+MAX_REMINDER_MINUTES = 180  # Largest accepted "N minutes before the lecture" value
+
+
+class ReminderScheduler:
+    def __init__(self, path, lectures_for, send, horizon_days=REMINDER_HORIZON_DAYS):
+        self.path = path
+        self.journal_path = f"{path}.log"
+        self.lectures_for = lectures_for  # lectures_for(key, date) -> [(start_minutes, text)]
+        self.send = send  # send(chat_id, text)
+        self.horizon_days = horizon_days
+        self.subscribers = {}  # chat_id -> (key, minutes)
+        self.jobs = {}  # job_id -> (fire_at, start_at, chat_id, key, text)
+        self.jobs_by_key = defaultdict(set)  # key -> job ids, so a schedule change only touches its own entries
+        self.jobs_by_chat = defaultdict(set)  # chat_id -> job ids
+        self.heap = []  # (fire_at, job_id), entries of removed jobs are skipped when popped
+        self.fired = {}  # job_id -> start_at, remembered until the lecture starts to avoid duplicates
+        self.condition = threading.Condition()
+        self.dirty = False
+        self.last_save = time.time()
+        self.planned_until = None
+        self.stop_event = threading.Event()
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logging.error(f"Failed to load reminders from {self.path}: {e}")
+                data = {}
+            for chat_id, (key, minutes) in data.get('subscribers', {}).items():
+                self.subscribers[int(chat_id)] = (tuple(key), minutes)
+            self.fired = data.get('fired', {})
+            texts = {}
+            for job_id, fire_at, start_at, chat_id, key, text in data.get('jobs', []):
+                self._add_job(job_id, fire_at, start_at, chat_id, tuple(key), texts.setdefault(text, text))
+
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, encoding='utf-8') as f:
+                for line in f:
+                    job_id, _, start_at = line.rstrip('\n').rpartition(' ')
+                    if job_id:
+                        self.fired[job_id] = float(start_at)
+                        self._remove_job(job_id)
+
+        logging.info(f"Loaded {len(self.subscribers)} reminder subscriptions and {len(self.jobs)} pending reminders")
+
+    def save(self):
+        with self.condition:
+            now = time.time()
+            self.fired = {job_id: start_at for job_id, start_at in self.fired.items() if start_at > now}
+            data = {
+                'subscribers': {str(chat_id): [list(key), minutes] for chat_id, (key, minutes) in self.subscribers.items()},
+                'jobs': [[job_id, *job[:3], list(job[3]), job[4]] for job_id, job in self.jobs.items()],
+                'fired': self.fired,
+            }
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            # Fired reminders are now part of the snapshot, so the journal can start over
+            open(self.journal_path, 'w').close()
+            self.dirty = False
+            self.last_save = now
+
+    def start(self):
+        self.plan_all()
+        threading.Thread(target=self._loop, name="reminder-scheduler", daemon=True).start()
+
+    def stop(self):
+        self.stop_event.set()
+        with self.condition:
+            self.condition.notify()
+        self.save()
+
+    def pending(self):
+        return len(self.jobs)
+
+    def subscribe(self, chat_id, key, minutes):
+        with self.condition:
+            self._remove_chat_jobs(chat_id)
+            self.subscribers[chat_id] = (tuple(key), minutes)
+            self._plan({tuple(key): [chat_id]}, self._planning_dates())
+            self.dirty = True
+            self.condition.notify()
+
+    def unsubscribe(self, chat_id):
+        with self.condition:
+            if self.subscribers.pop(chat_id, None) is None:
+                return False
+            self._remove_chat_jobs(chat_id)
+            self.dirty = True
+        return True
+
+    def reschedule(self, key):
+        # Called when the schedule snapshot behind `key` changed, other keys keep their heap entries
+        with self.condition:
+            for job_id in list(self.jobs_by_key.get(key, ())):
+                self._remove_job(job_id)
+            chat_ids = [chat_id for chat_id, (chat_key, _) in self.subscribers.items() if chat_key == key]
+            if chat_ids:
+                self._plan({key: chat_ids}, self._planning_dates())
+            self.condition.notify()
+        logging.info(f"Rescheduled reminders for {key}: {len(self.jobs_by_key.get(key, ()))} pending")
+
+    def plan_all(self):
+        with self.condition:
+            dates = self._planning_dates()
+            if self.planned_until:
+                dates = [date for date in dates if date > self.planned_until]
+            self._plan(self._chats_by_key(), dates)
+            self.planned_until = dates[-1] if dates else self.planned_until
+            self.condition.notify()
+
+    def _planning_dates(self):
+        today = datetime.now().date()
+        return [today + timedelta(days=offset) for offset in range(self.horizon_days)]
+
+    def _chats_by_key(self):
+        chats_by_key = defaultdict(list)
+        for chat_id, (key, _) in self.subscribers.items():
+            chats_by_key[key].append(chat_id)
+        return chats_by_key
+
+    def _plan(self, chats_by_key, dates):
+        now = time.time()
+        for key, chat_ids in chats_by_key.items():
+            for date in dates:
+                midnight = datetime.combine(date, datetime.min.time()).timestamp()
+                for start_minutes, text in self.lectures_for(key, date):
+                    start_at = midnight + start_minutes * 60
+                    for chat_id in chat_ids:
+                        minutes = self.subscribers[chat_id][1]
+                        fire_at = start_at - minutes * 60
+                        job_id = f"{chat_id}:{date.isoformat()}:{start_minutes}"
+                        if fire_at > now and job_id not in self.fired:
+                            self._add_job(job_id, fire_at, start_at, chat_id, key, text)
+
+    def _add_job(self, job_id, fire_at, start_at, chat_id, key, text):
+        previous = self.jobs.get(job_id)
+        self.jobs[job_id] = (fire_at, start_at, chat_id, key, text)
+        self.jobs_by_key[key].add(job_id)
+        self.jobs_by_chat[chat_id].add(job_id)
+        if previous is None or previous[0] != fire_at:
+            heapq.heappush(self.heap, (fire_at, job_id))
+        self.dirty = True
+
+    def _remove_job(self, job_id):
+        job = self.jobs.pop(job_id, None)
+        if job is None:
+            return
+        self.jobs_by_key[job[3]].discard(job_id)
+        self.jobs_by_chat[job[2]].discard(job_id)
+        self.dirty = True
+        # Stale heap entries are dropped lazily, the heap is rebuilt once they dominate it
+        if len(self.heap) > 2 * len(self.jobs) + 1024:
+            self.heap = [(job[0], job_id) for job_id, job in self.jobs.items()]
+            heapq.heapify(self.heap)
+
+    def _remove_chat_jobs(self, chat_id):
+        for job_id in list(self.jobs_by_chat.pop(chat_id, ())):
+            self._remove_job(job_id)
+
+    def _pop_due(self, now):
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            fire_at, job_id = heapq.heappop(self.heap)
+            job = self.jobs.get(job_id)
+            if job is None or job[0] != fire_at:
+                continue
+            self._remove_job(job_id)
+            self.fired[job_id] = job[1]
+            if job[1] > now:
+                due.append((job_id, job))
+        if due:
+            with open(self.journal_path, 'a', encoding='utf-8') as journal:
+                journal.writelines(f"{job_id} {job[1]}\n" for job_id, job in due)
+        return due
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            with self.condition:
+                now = time.time()
+                if self.planned_until != datetime.now().date() + timedelta(days=self.horizon_days - 1):
+                    self.plan_all()
+                due = self._pop_due(now)
+                if not due:
+                    next_day = datetime.combine(datetime.now().date() + timedelta(days=1), datetime.min.time())
+                    timeout = next_day.timestamp() - now
+                    if self.heap:
+                        timeout = min(timeout, self.heap[0][0] - now)
+                    self.condition.wait(min(timeout, REMINDER_SAVE_INTERVAL))
+
+            for job_id, (_, _, chat_id, _, text) in due:
+                try:
+                    self.send(chat_id, text)
+                except Exception as e:
+                    logging.error(f"Failed to send reminder {job_id}: {e}")
+
+            if self.dirty and time.time() - self.last_save >= REMINDER_SAVE_INTERVAL:
+                self.save()
@@ -0,0 +1,51 @@
+import argparse
+import logging
+import time
+
+from load_harness import start_bot_stack, report
+from logging_setup import setup_logging
+from update_recorder import read_updates
+
+
+def replay(api, records, speed):
+    # Keeps the recorded gaps between updates divided by `speed`, speed 0 sends everything at once
+    if not records:
+        return
+    recorded_start = records[0]['t']
+    started = time.perf_counter()
+    for record in records:
+        if speed:
+            delay = started + (record['t'] - recorded_start) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        api.inject_message(record['message'])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded update stream against a local bot")
+    parser.add_argument('path', help="File written by UPDATE_LOG_PATH")
+    parser.add_argument('--speed', type=float, default=1.0, help="1, 10, 100 times the recorded pace, 0 for no gaps")
+    parser.add_argument('--limit', type=int, help="Replay only the first N updates")
+    parser.add_argument('--latency', type=float, default=0.05, help="Seconds the fake Bot API adds to every call")
+    parser.add_argument('--rows-per-day', type=int, default=4, help="Size of the generated schedule page")
+    parser.add_argument('--timeout', type=float, default=30, help="Seconds to wait for replies after the last update")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    setup_logging(args.log_level)
+
+    records = sorted(read_updates(args.path), key=lambda record: (record['t'], record['update_id']))[:args.limit]
+    if records:
+        recorded_seconds = records[-1]['t'] - records[0]['t']
+        print(f"Replaying {len(records)} updates recorded over {recorded_seconds:.0f}s at {args.speed:g}x")
+
+    _, api = start_bot_stack(args.latency, args.rows_per_day, args.timeout)
+    replay(api, records, args.speed)
+    # Updates the bot does not answer leave their chat pending, a replay reports them instead of failing
+    completed = api.wait_for_replies(len(records), args.timeout)
+    if records:
+        report(api, len(records), completed)
+    logging.shutdown()
+
+
+if __name__ == '__main__':
+    main()
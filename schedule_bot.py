@@ -1,24 +1,53 @@
+import functools
+import hashlib
+import os
 import re
+import signal
+import sqlite3
+import threading
 import time
-from datetime import datetime
+from bisect import bisect_right
+from datetime import datetime, timedelta
 from enum import Enum
 
 import telebot
 import logging
 from collections import defaultdict
 from telebot import types
-from bs4 import BeautifulSoup
 import requests
 
+from academic_calendar import MAX_WEEK
+from broadcast import SubscriptionStore, SendQueue, DigestBroadcaster, BroadcastJob, observe_send
+from logging_setup import MESSAGE_LOGGER
+from metrics import REGISTRY, LATENCY_BUCKETS, ActivityTracker, resident_memory_bytes
+from tracing import TRACER
+from reminders import ReminderScheduler, MAX_REMINDER_MINUTES
+from schedule_index import TeacherIndex, RoomIndex
+from fuzzy_search import TrigramIndex
+from crawler import Crawler, schedule_form, CHECKPOINT_PATH, PAGES_DIR
+from refresh_scheduler import RefreshScheduler
+from prefetch import WeekBoundaryPrefetcher, PREFETCH_REFRESH_TIMEOUT
+from schedule_store import ScheduleStore
+from schedule_snapshot import SnapshotExporter
+from lecture_columns import ColumnarLectureStore
+from startup_profile import StartupProfiler
+from on_demand_profiler import OnDemandProfiler, parse_profile_request, MAX_PROFILE_SECONDS, PROFILE_DIR
+
 
 MAX_RETRIES = 7  # Maximum number of retries for fetching schedule
 TIMEOUT_SECONDS = 5  # Timeout duration for fetching the HTML page
+MAX_MESSAGE_LENGTH = 4096  # Telegram limit for a single message
+DEFAULT_GROUP_FORM = {'faculty': '11', 'form': '10', 'course': '1', 'group': '9499'}  # Group requested from the website
+DEFAULT_GROUP = DEFAULT_GROUP_FORM['group']
+SUBSCRIPTIONS_PATH = "subscriptions.json"  # Where daily digest subscribers are stored
+REMINDERS_PATH = "reminders.json"  # Where reminder subscriptions and pending reminders are stored
+SCHEDULE_DB_PATH = "schedules.db"  # SQLite store of every group's lectures, restored on startup, read by offline tools
+MINUTES_IN_DAY = 24 * 60  # Sort position for lectures whose time slot could not be parsed
+CACHED_WEEKS_AHEAD = 2  # Rendered weeks and days are cached from the current week on, as far as the prefetch warms
+WEEKDAYS = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота"]
+WEEKDAY_ABBREVIATIONS = ["пн", "вт", "ср", "чт", "пт", "сб"]
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+MESSAGE_LOG = logging.getLogger(MESSAGE_LOGGER)
 
 class ScheduleBotAction(str, Enum):
     GET_SCHEDULE_WEEK = "Получить расписание на неделю"
@@ -27,22 +56,74 @@ class ScheduleBotAction(str, Enum):
     NEXT_WEEK = "Следующая неделя"
     PREVIOUS_WEEK = "Предыдущая неделя"
     SPECIFIC_WEEK = "Выбрать конкретную неделю"
+    NOW = "Сейчас"
+    NEXT_LECTURE = "Следующая пара"
+    TODAY = "Сегодня"
+    TOMORROW = "Завтра"
     BACK = "Назад"
     WELCOME_MESSAGE = "Добро пожаловать! Выберите кнопку, чтобы получить расписание"
     CHOOSE_WEEK_MESSAGE = "Выберите неделю, на которую вы хотите увидеть расписание"
-    CHOOSE_DAY_MESSAGE = "Выберите день, на который вы хотите увидеть расписание"
+    CHOOSE_DAY_MESSAGE = "Выберите день или введите дату (например, 25.10), на которую вы хотите увидеть расписание"
     ENTER_WEEK_MESSAGE = "Введите номер недели, на которую вы хотите увидеть расписание"
+    SUBSCRIBED_MESSAGE = "Вы подписались на ежедневную рассылку расписания на завтра"
+    UNSUBSCRIBED_MESSAGE = "Вы отписались от ежедневной рассылки"
+    NOT_SUBSCRIBED_MESSAGE = "Вы не были подписаны на рассылку"
+    REMIND_USAGE_MESSAGE = f"Укажите, за сколько минут до пары напоминать (1-{MAX_REMINDER_MINUTES}), например: /remind 15. Отключить: /remind off"
+    REMINDERS_OFF_MESSAGE = "Напоминания о парах отключены"
+    LOADING_MESSAGE = "Расписание загружается, ответ придёт через несколько секунд"
+    NO_CURRENT_LECTURE_MESSAGE = "Сейчас пары нет"
+    NO_NEXT_LECTURE_MESSAGE = "В ближайшие дни пар нет"
+    TEACHER_USAGE_MESSAGE = "Укажите фамилию преподавателя, например: /teacher Иванов или /teacher Иванов 7 для 7-й недели"
+    TEACHER_NOT_FOUND_MESSAGE = "Преподаватель не найден"
+    FIND_USAGE_MESSAGE = "Укажите, что искать, например: /find Иванов"
+    NOTHING_FOUND_MESSAGE = "Ничего не найдено"
+    ROOMS_USAGE_MESSAGE = "Укажите день и номер пары, например: /rooms вторник 3 или /rooms вторник 3 7 для 7-й недели"
+    ROOMS_SLOT_NOT_FOUND_MESSAGE = "В этот день нет такой пары"
+    PROFILE_USAGE_MESSAGE = f"Использование: /profile [cprofile|sample] [30s|100u], не дольше {MAX_PROFILE_SECONDS} секунд"
+    PROFILE_BUSY_MESSAGE = "Профилирование уже запущено"
+    PROFILE_STARTED_MESSAGE = "Профилирование ({mode}) запущено на {limit}"
+
+ACTIONS_BY_TEXT = {action.value: action.name for action in ScheduleBotAction}
+
+FETCH_ATTEMPTS = REGISTRY.counter('schedule_fetch_attempts_total', "Requests to the university website by outcome", ['outcome'])
+FETCH_SECONDS = REGISTRY.histogram('schedule_fetch_seconds', "Duration of a single request to the university website")
+PARSE_SECONDS = REGISTRY.histogram('schedule_parse_seconds', "Time to parse a schedule page")
+INDEX_BUILD_SECONDS = REGISTRY.histogram('schedule_index_build_seconds', "Time to extract a group's lectures and update the indexes")
+CACHE_REQUESTS = REGISTRY.counter('schedule_cache_requests_total', "Schedule cache lookups", ['cache', 'result'])
+HANDLER_SECONDS = REGISTRY.histogram('bot_handler_seconds', "Time to answer a message by action", ['action'])
+
+PROFILE_SIGNAL_SECONDS = 30  # Length of the sampling session started by SIGUSR1
+ACTIVE_USER_WINDOWS = {'1h': 60 * 60, '24h': 24 * 60 * 60}  # Windows of the active users gauge and /stats
+
+def log_user_action(message, action, *args, level=logging.INFO):
+    # Per-message line: sampled, and formatted on the logging thread only if it is written
+    if MESSAGE_LOG.isEnabledFor(level):
+        MESSAGE_LOG.log(level, action, *args, extra={
+            'user_id': message.from_user.id, 'username': message.from_user.username, 'chat_id': message.chat.id
+        })
 
-def fetch_data(website_url, week):
-    logging.info("Fetching data from website")
+
+def parse_group_forms(value):
+    # "11:10:1:9499,11:10:1:9500" -> faculty:form:course:group of every group to cache
+    group_forms = []
+    for item in (value or "").split(','):
+        if not item.strip():
+            continue
+        fields = item.strip().split(':')
+        if len(fields) != 4:
+            raise ValueError(f"Invalid group '{item}', expected faculty:form:course:group")
+        group_forms.append(dict(zip(('faculty', 'form', 'course', 'group'), fields)))
+    return group_forms
+
+
+def fetch_data(website_url, week, group_form=DEFAULT_GROUP_FORM, before_attempt=None):
+    # before_attempt() runs before every attempt, retries included, e.g. to wait for a rate limiter
+    logging.info(f"Fetching data from website for group {group_form['group']}")
     headers = {
         'Content-Type': 'application/x-www-form-urlencoded'
     }
     data = {
-        'faculty': '11',
-        'form': '10',
-        'course': '1',
-        'group': '9499',
+        **group_form,
         'tname': '',
         'period': '3',
         'week': week,
@@ -50,16 +131,24 @@ def fetch_data(website_url, week):
     }
 
     for attempt in range(1, MAX_RETRIES + 1):
+        if before_attempt:
+            before_attempt()
+        started = time.perf_counter()
         try:
             logging.info(f"Fetch attempt {attempt}")
             response = requests.post(website_url, headers=headers, data=data, timeout=TIMEOUT_SECONDS)
             response.raise_for_status()
+            FETCH_ATTEMPTS.inc('ok')
             logging.info("Successfully fetched HTML page")
             return response.text
         except requests.exceptions.Timeout:
+            FETCH_ATTEMPTS.inc('timeout')
             logging.warning(f"Attempt {attempt}: Fetch timed out after {TIMEOUT_SECONDS} seconds")
         except requests.exceptions.RequestException as e:
+            FETCH_ATTEMPTS.inc('error')
             logging.error(f"Attempt {attempt}: Failed to fetch schedule - {e}")
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - started)
 
         if attempt == MAX_RETRIES:
             logging.error("Max retries reached. Stopping the bot.")
@@ -68,6 +157,8 @@ def fetch_data(website_url, week):
 
 def parse_html(html_doc):
     logging.info("Parsing HTML document")
+    from bs4 import BeautifulSoup  # Loaded with the first page, polling starts without it
+
     soup = BeautifulSoup(html_doc, 'html.parser')
     table = soup.find('table', {'id': 'sched'})
     if table:
@@ -76,13 +167,24 @@ def parse_html(html_doc):
         logging.warning("Schedule table not found in HTML document")
     return table
 
-def get_current_week():
-    today = datetime.now().date()
-    # Assuming the school year starts on the 1st of September
-    start_of_school_year = datetime(today.year if today.month >= 9 else today.year - 1, 9, 1).date()
+def parse_time_slot(time_slot):
+    match = re.search(r'(\d{1,2})[:.](\d{2})\s*[-–—]\s*(\d{1,2})[:.](\d{2})', time_slot)
+    if not match:
+        return None
+    start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+    return start_hour * 60 + start_minute, end_hour * 60 + end_minute
+
+
+def parse_week_mask(week_info):
+    mask = 0
+    for week in re.findall(r'\d+(?:-\d+)?', week_info):
+        if '-' in week:
+            start, end = map(int, week.split('-'))
+            mask |= ((1 << (end - start + 1)) - 1) << start if end >= start else 0
+        else:
+            mask |= 1 << int(week)
+    return mask
 
-    week_number = ((today - start_of_school_year).days // 7) + 1
-    return week_number
 
 def get_week_match(week_info, current_week):
     week_match = re.findall(r'\d+(?:-\d+)?', week_info)
@@ -104,6 +206,8 @@ def process_regular_rows(cells, current_week):
     if not get_week_match(week_info, current_week):
         return None
 
+    start, end = parse_time_slot(time_slot) or (None, None)
+
     subject_and_teacher = cells[2].text.strip()
     classroom = cells[3].text.strip()
 
@@ -117,6 +221,8 @@ def process_regular_rows(cells, current_week):
 
     return {
         'Time': time_slot,
+        'Start': start,
+        'End': end,
         'Subject': subject,
         'Teacher': teacher,
         'Classroom': classroom
@@ -145,10 +251,85 @@ def extract_lecture_info(schedule_table, current_week, subgroup, sub_subgroup):
             if lecture and lecture not in lecture_info[current_day]:
                 lecture_info[current_day].append(lecture)
 
+    for lectures in lecture_info.values():
+        lectures.sort(key=lecture_start)
+
     logging.info("Completed lecture extraction")
     return lecture_info
 
 
+def extract_all_lectures(schedule_table):
+    # Week independent pass: every lecture of the table with the weeks it takes place on as a bit mask
+    lectures = []
+    current_day = None
+    language_row = None
+
+    for row in schedule_table.find_all('tr'):
+        cells = row.find_all('td')
+
+        if len(cells) == 1 and 'colspan' in cells[0].attrs:
+            current_day = cells[0].text.strip()
+            language_row = None
+            continue
+
+        if len(cells) >= 3 and 'Иностранный язык' in cells[2].text:
+            language_row = (cells[0].text.strip(), parse_week_mask(cells[1].text.strip()), cells[2].text.strip())
+            continue
+
+        if len(cells) == 3 and language_row:
+            time_slot, weeks, subject = language_row
+            group = cells[0].text.strip()
+            teacher = cells[1].text.strip()
+            classroom = cells[2].text.strip()
+            subgroup = group
+            subject = f"{subject} ({group})"
+        elif len(cells) == 4:
+            language_row = None
+            time_slot = cells[0].text.strip()
+            weeks = parse_week_mask(cells[1].text.strip())
+            subject_and_teacher = cells[2].text.strip()
+            classroom = cells[3].text.strip()
+            subgroup = ''
+            if ',' in subject_and_teacher:
+                subject, teacher = subject_and_teacher.rsplit(',', 1)
+                subject = subject.strip()
+                teacher = teacher.strip()
+            else:
+                subject = subject_and_teacher
+                teacher = ''
+        else:
+            language_row = None
+            continue
+
+        start, end = parse_time_slot(time_slot) or (None, None)
+        lectures.append({
+            'Day': current_day,
+            'Weeks': weeks,
+            'Subgroup': subgroup,
+            'Time': time_slot,
+            'Start': start,
+            'End': end,
+            'Subject': subject,
+            'Teacher': teacher,
+            'Classroom': classroom
+        })
+
+    return lectures
+
+
+def lecture_start(lecture):
+    return lecture['Start'] if lecture['Start'] is not None else MINUTES_IN_DAY
+
+
+def find_current_and_next(lectures, starts, minute):
+    index = bisect_right(starts, minute)
+    current = None
+    if index and lectures[index - 1]['End'] is not None and lectures[index - 1]['End'] > minute:
+        current = lectures[index - 1]
+    upcoming = lectures[index] if index < len(lectures) and lectures[index]['Start'] is not None else None
+    return current, upcoming
+
+
 def process_language_rows(row, current_week, subgroup, sub_subgroup):
     lecture_info = []
     time_slot = row.find_all('td')[0].text.strip()
@@ -157,6 +338,7 @@ def process_language_rows(row, current_week, subgroup, sub_subgroup):
     if not get_week_match(week_info, current_week):
         return lecture_info
 
+    start, end = parse_time_slot(time_slot) or (None, None)
     subject = row.find_all('td')[2].text.strip()
     for group_row in row.find_next_siblings('tr'):
         group_cells = group_row.find_all('td')
@@ -168,6 +350,8 @@ def process_language_rows(row, current_week, subgroup, sub_subgroup):
             if subgroup in group or sub_subgroup in group:
                 lecture = {
                     'Time': time_slot,
+                    'Start': start,
+                    'End': end,
                     'Subject': f"{subject} ({group})",
                     'Teacher': teacher,
                     'Classroom': classroom
@@ -196,39 +380,622 @@ def display_lecture_info(lecture_info):
     return "\n".join(output)
 
 
+def parse_user_date(text, today):
+    match = re.fullmatch(r'(\d{1,2})\.(\d{1,2})(?:\.(\d{4}))?', text.strip())
+    if not match:
+        return None
+    day, month, year = match.groups()
+    try:
+        return datetime(int(year) if year else today.year, int(month), int(day)).date()
+    except ValueError:
+        return None
+
+
+def display_teacher_slots(teacher_slots, group_names):
+    output = []
+    for teacher, slots in teacher_slots.items():
+        output.append(f"{teacher}:")
+        for slot in sorted(slots, key=lambda slot: (day_order(slot.day), slot.start or MINUTES_IN_DAY)):
+            output.append(f"  {slot.day}, {slot.time}")
+            output.append(f"  Subject: {slot.subject}")
+            output.append(f"  Group: {group_names.get(slot.group, slot.group)}")
+            output.append(f"  Classroom: {slot.room}")
+            output.append("")
+    return "\n".join(output)
+
+
+def search_terms(group, lectures):
+    terms = {('group', group)}
+    for lecture in lectures:
+        if lecture['Teacher']:
+            terms.add(('teacher', lecture['Teacher']))
+        terms.add(('subject', lecture['Subject']))
+    return terms
+
+
+def parse_weekday(text):
+    text = text.lower().rstrip('.')
+    if text in WEEKDAY_ABBREVIATIONS:
+        return WEEKDAYS[WEEKDAY_ABBREVIATIONS.index(text)]
+    matches = [day for day in WEEKDAYS if len(text) >= 2 and day.startswith(text)]
+    return matches[0] if len(matches) == 1 else None
+
+
+def day_order(day):
+    return WEEKDAYS.index(day) if day in WEEKDAYS else len(WEEKDAYS)
+
+
+def split_message(text, max_length=MAX_MESSAGE_LENGTH):
+    return [text[i:i + max_length] for i in range(0, len(text), max_length)]
+
+
+def format_age(seconds):
+    if seconds is None:
+        return "нет данных"
+    if seconds < 60 * 60:
+        return f"{seconds / 60:.0f} мин"
+    return f"{seconds / 3600:.1f} ч"
+
+
+def format_latency(seconds):
+    # Histogram quantiles are bucket upper bounds
+    if seconds is None:
+        return "нет данных"
+    return f"≤{seconds * 1000:.0f} мс" if seconds != float('inf') else f">{LATENCY_BUCKETS[-1]:.0f} с"
+
+
 class ScheduleBot:
-    def __init__(self, telegram_bot_token, website_url, subgroup, sub_subgroup):
+    def __init__(self, telegram_bot_token, website_url, subgroup, sub_subgroup, digest_time, calendar, group_forms=None,
+                 crawl_catalog=False, profiler=None, update_recorder=None, admin_ids=(), snapshot_path=None,
+                 data_dir='.'):
+        # data_dir holds the files the bot writes: subscriptions, reminders, the schedule store, crawl and profiles
+        self.profiler = profiler or StartupProfiler(time.perf_counter())
+        self.on_demand_profiler = OnDemandProfiler(os.path.join(data_dir, PROFILE_DIR))
+        self.admin_ids = set(admin_ids)  # Telegram user IDs allowed to run admin commands
+        self.active_users = ActivityTracker()
+        self.update_recorder = update_recorder  # Records polled updates for replay when set
         self.bot = telebot.TeleBot(telegram_bot_token)
         self.website_url = website_url
         self.subgroup = subgroup
         self.sub_subgroup = sub_subgroup
-        self.cached_schedule_table = None
-        self.week = get_current_week()
+        self.group_forms = group_forms or [DEFAULT_GROUP_FORM]
+        self.crawl_catalog = crawl_catalog
+        self.crawler = Crawler(website_url, fetch_data, os.path.join(data_dir, CHECKPOINT_PATH),
+                               os.path.join(data_dir, PAGES_DIR))
+        self.group_names = {}  # group -> name from the website catalog
+        self.group_forms_by_id = {group_form['group']: group_form for group_form in self.group_forms}
+        self.page_hashes = {}  # group -> hash of the last parsed page
+        self.index_lock = threading.Lock()  # Refreshes update the indexes while handlers query them
+        self.refresh_scheduler = RefreshScheduler(self.refresh_group)
+        self.prefetcher = WeekBoundaryPrefetcher(self.prefetch_week)
+        self.ready = threading.Event()  # Set once the bot's own group is loaded
+        self.pending_lock = threading.Lock()
+        self.pending_messages = []  # Messages received while loading, answered once ready
+        self.schedule_groups = {}  # group -> whether its page had a schedule table, parsed or restored from the store
+        self.teacher_index = TeacherIndex()
+        self.room_index = RoomIndex()
+        self.search_index = TrigramIndex()
+        self.lecture_columns = ColumnarLectureStore()  # Every group's lectures, what week lookups read
+        self.lecture_cache = {}  # (week, subgroup, sub_subgroup) -> extracted lecture info
+        self.day_cache = {}  # (week, day, subgroup, sub_subgroup) -> (sorted lectures, their start minutes)
+        self.render_cache = {}  # (week, subgroup, sub_subgroup) -> rendered week schedule split into messages
+        self.calendar = calendar
         self.cat_image_path = "cat.jpg"
+        with self.profiler.phase('snapshot_load'):
+            self.subscriptions = SubscriptionStore(os.path.join(data_dir, SUBSCRIPTIONS_PATH))
+            self.schedule_store = ScheduleStore(os.path.join(data_dir, SCHEDULE_DB_PATH))
+        # Memory-mapped snapshot of the store for other processes, written when a path is set
+        self.snapshot_exporter = SnapshotExporter(self.schedule_store, snapshot_path) if snapshot_path else None
+        self.send_queue = SendQueue(self.bot, on_blocked=self.subscriptions.unsubscribe)
+        self.digest = DigestBroadcaster(self.subscriptions, self.send_queue, self.render_digest, digest_time)
+        self.reminder_job = BroadcastJob("reminders")
+        with self.profiler.phase('snapshot_load'):
+            self.reminders = ReminderScheduler(os.path.join(data_dir, REMINDERS_PATH), self.lectures_for_reminders,
+                                               self.send_reminder)
+        self.register_metrics()
+
+    def set_schedule_table(self, schedule_table, group=DEFAULT_GROUP, page_hash=None):
+        with self.profiler.phase('index_build'), INDEX_BUILD_SECONDS.time():
+            lectures = extract_all_lectures(schedule_table) if schedule_table else None
+            self._update_indexes(lectures, group)
+        try:
+            self.schedule_store.save_group(group, lectures, page_hash)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to store the schedule of group {group}: {e}")
+        self.set_group_loaded(group, lectures is not None)
+
+    def set_group_loaded(self, group, has_table):
+        self.schedule_groups[group] = has_table
+        if group == DEFAULT_GROUP:
+            # Cleared once the store has the new lectures, so no handler caches the old ones again
+            self.lecture_cache = {}
+            self.day_cache = {}
+            self.render_cache = {}
+
+    def export_snapshot(self):
+        if self.snapshot_exporter:
+            self.snapshot_exporter.request()
+
+    def has_schedule(self):
+        return self.schedule_groups.get(DEFAULT_GROUP, False)
+
+    def restore_groups(self):
+        # Warm restart: the stored lectures answer right away and pages that did not change are not parsed again
+        try:
+            stored = self.schedule_store.groups()
+            for group, (page_hash, has_table, _) in stored.items():
+                if group not in self.group_forms_by_id and not self.crawl_catalog:
+                    continue
+                self._update_indexes(self.schedule_store.lectures(group) if has_table else None, group)
+                self.page_hashes[group] = page_hash
+                self.set_group_loaded(group, has_table)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to restore schedules from {self.schedule_store.path}: {e}")
+            return
+        logging.info(f"Restored {len(self.schedule_groups)} groups from {self.schedule_store.path}")
+
+    def _update_indexes(self, lectures, group):
+        self.lecture_columns.update_group(group, lectures)
+        with self.index_lock:
+            if lectures is not None:
+                self.teacher_index.update_group(group, lectures)
+                self.room_index.update_group(group, lectures)
+                self.search_index.update_group(group, search_terms(self.group_names.get(group, group), lectures))
+            else:
+                self.teacher_index.remove_group(group)
+                self.room_index.remove_group(group)
+                self.search_index.update_group(group, ())
+
+    def load_group_page(self, group, html_doc):
+        page_hash = hashlib.sha1(html_doc.encode('utf-8')).hexdigest()
+        if self.page_hashes.get(group) == page_hash:
+            return False
+        with self.profiler.phase('parse'), PARSE_SECONDS.time():
+            schedule_table = parse_html(html_doc)
+        self.set_schedule_table(schedule_table, group, page_hash)
+        self.page_hashes[group] = page_hash
+        return True
+
+    def refresh_group(self, group):
+        html_doc = fetch_data(self.website_url, self.calendar.week(), schedule_form(self.group_forms_by_id[group]))
+        if not self.load_group_page(group, html_doc):
+            return False
+
+        logging.info(f"Schedule of group {group} changed")
+        self.export_snapshot()
+        for key in {key for key, _ in list(self.reminders.subscribers.values()) if key[0] == group}:
+            self.reminders.reschedule(key)
+        return True
+
+    def get_lecture_info(self, week, subgroup=None, sub_subgroup=None):
+        subgroup = subgroup or self.subgroup
+        sub_subgroup = sub_subgroup or self.sub_subgroup
+        key = (week, subgroup, sub_subgroup)
+        with TRACER.span('cache_lookup', cache='lecture') as span:
+            lecture_info = self.lecture_cache.get(key)
+            span['hit'] = lecture_info is not None
+        CACHE_REQUESTS.inc('lecture', 'miss' if lecture_info is None else 'hit')
+        if lecture_info is None:
+            if not self.has_schedule():
+                return {}
+            with TRACER.span('extract', week=week):
+                lecture_info = self.lecture_columns.lecture_info(DEFAULT_GROUP, week, subgroup, sub_subgroup)
+            if 1 <= week <= MAX_WEEK:  # Any number can be typed in, only weeks of the calendar are kept
+                self.lecture_cache[key] = lecture_info
+        return lecture_info
+
+    def get_week_parts(self, week, subgroup=None, sub_subgroup=None):
+        subgroup = subgroup or self.subgroup
+        sub_subgroup = sub_subgroup or self.sub_subgroup
+        key = (week, subgroup, sub_subgroup)
+        with TRACER.span('cache_lookup', cache='render') as span:
+            parts = self.render_cache.get(key)
+            span['hit'] = parts is not None
+        CACHE_REQUESTS.inc('render', 'miss' if parts is None else 'hit')
+        if parts is None:
+            lecture_info = self.get_lecture_info(week, subgroup, sub_subgroup)
+            with TRACER.span('render', week=week):
+                parts = split_message(display_lecture_info(lecture_info) if lecture_info else "Расписание не найдено")
+            if self.has_schedule():
+                self.cache_week(self.render_cache, key, parts)
+        return parts
+
+    def cache_week(self, cache, key, value):
+        # Caches by week, key[0]: only the weeks users mostly ask for are kept, entries of other weeks are dropped
+        current = self.calendar.week()
+        if not current <= key[0] <= current + CACHED_WEEKS_AHEAD:
+            return
+        for stale in [cached for cached in list(cache) if not current <= cached[0] <= current + CACHED_WEEKS_AHEAD]:
+            cache.pop(stale, None)
+        cache[key] = value
+
+    def prefetch_week(self, boundary):
+        # Sunday evening asks for the next week, Monday morning for the current one, both are the week at `boundary`
+        active_groups = set(self.refresh_scheduler.active_groups())
+        active_groups.discard(DEFAULT_GROUP)
+        self.refresh_scheduler.expedite(active_groups)
+        # Through the scheduler, a refresh worker may be fetching the same group
+        if not self.refresh_scheduler.refresh_now(DEFAULT_GROUP, PREFETCH_REFRESH_TIMEOUT):
+            logging.error("Prefetch could not refresh the schedule, warming caches from the cached one")
+
+        week = self.calendar.week(boundary.date())
+        subgroups = {(self.subgroup, self.sub_subgroup)}
+        subgroups.update((subgroup, sub_subgroup) for group, subgroup, sub_subgroup in self.subscriptions.grouped()
+                         if group == DEFAULT_GROUP)
+        for subgroup, sub_subgroup in subgroups:
+            for offset in range(7):
+                self.get_day_lectures(boundary.date() + timedelta(days=offset), subgroup, sub_subgroup)
+            self.get_week_parts(week, subgroup, sub_subgroup)
+            self.get_week_parts(week + 1, subgroup, sub_subgroup)
+        logging.info(f"Prefetched week {week} for {len(subgroups)} subgroups, {len(active_groups)} active groups queued")
+
+    def get_day_lectures(self, date, subgroup=None, sub_subgroup=None):
+        week, weekday = self.calendar.lookup(date)
+        if weekday is None:
+            return None, [], []
+        subgroup = subgroup or self.subgroup
+        sub_subgroup = sub_subgroup or self.sub_subgroup
+        day = WEEKDAYS[weekday]
+        key = (week, day, subgroup, sub_subgroup)
+        with TRACER.span('cache_lookup', cache='day') as span:
+            cached = self.day_cache.get(key)
+            span['hit'] = cached is not None
+        CACHE_REQUESTS.inc('day', 'miss' if cached is None else 'hit')
+        if cached is None:
+            lectures = self.get_lecture_info(week, subgroup, sub_subgroup).get(day, [])
+            cached = (lectures, [lecture_start(lecture) for lecture in lectures])
+            if self.has_schedule():
+                self.cache_week(self.day_cache, key, cached)
+        return (day, *cached)
+
+    def lectures_for_reminders(self, key, date):
+        group, subgroup, sub_subgroup = key
+        if group != DEFAULT_GROUP:
+            return []
+
+        _, lectures, _ = self.get_day_lectures(date, subgroup, sub_subgroup)
+        return [
+            (lecture['Start'], f"Скоро пара ({lecture['Time']}): {lecture['Subject']}, {lecture['Classroom']}")
+            for lecture in lectures if lecture['Start'] is not None
+        ]
+
+    def send_reminder(self, chat_id, text):
+        self.send_queue.submit(self.reminder_job, [chat_id], [text])
+
+    def render_digest(self, date, key):
+        group, subgroup, sub_subgroup = key
+        if group != DEFAULT_GROUP or not self.has_schedule():
+            return None
+
+        day, day_schedule, _ = self.get_day_lectures(date, subgroup, sub_subgroup)
+        if day is None:
+            return None
+        if day_schedule:
+            content = display_lecture_info({day: day_schedule})
+        else:
+            content = "Занятий нет"
+        return split_message(f"Расписание на завтра (неделя {self.calendar.week(date)})\n\n{content}")
+
+    def send_message(self, chat_id, text, **kwargs):
+        with TRACER.span('send_message', length=len(text)):
+            result = observe_send('send_message', self.bot.send_message, chat_id, text, **kwargs)
+        self.profiler.mark('first_reply')
+        return result
+
+    def send_photo(self, chat_id, photo, **kwargs):
+        with TRACER.span('send_photo'):
+            result = observe_send('send_photo', self.bot.send_photo, chat_id, photo, **kwargs)
+        self.profiler.mark('first_reply')
+        return result
+
+    def send_document(self, chat_id, document, **kwargs):
+        with TRACER.span('send_document'):
+            return observe_send('send_document', self.bot.send_document, chat_id, document, **kwargs)
+
+    def send_profile(self, chat_ids, summary, stats_path):
+        for chat_id in chat_ids:
+            for part in split_message(summary):
+                self.send_message(chat_id, part)
+            if stats_path:
+                with open(stats_path, 'rb') as f:
+                    self.send_document(chat_id, f)
+
+    def memory_components(self):
+        # What the memory profiling mode sizes: schedule caches, indexes and state kept per user
+        return {
+            'lecture_cache': lambda: self.lecture_cache,
+            'day_cache': lambda: self.day_cache,
+            'render_cache': lambda: self.render_cache,
+            'lecture_columns': lambda: self.lecture_columns,
+            'indexes': lambda: (self.teacher_index, self.room_index, self.search_index),
+            'subscriptions': lambda: self.subscriptions.subscribers,
+            'reminders': lambda: (self.reminders.subscribers, self.reminders.jobs, self.reminders.jobs_by_chat,
+                                  self.reminders.jobs_by_key, self.reminders.heap, self.reminders.fired),
+            'active_users': lambda: self.active_users.last_seen,
+            'refresh_state': lambda: self.refresh_scheduler.groups,
+        }
+
+    def is_admin(self, message):
+        return message.from_user is not None and message.from_user.id in self.admin_ids
+
+    def render_stats(self):
+        # Reads lock-free metric snapshots, the refresh scheduler lock is held only for a pass over its groups
+        refresh = self.refresh_scheduler.metrics()
+        cache_requests = CACHE_REQUESTS.values()
+        cache_lines = []
+        for cache in ('lecture', 'day', 'render'):
+            hits = cache_requests.get((cache, 'hit'), 0)
+            total = hits + cache_requests.get((cache, 'miss'), 0)
+            ratio = f"{hits / total:.0%}" if total else "нет запросов"
+            cache_lines.append(f"  {cache}: {ratio} ({hits} из {total})")
+        uptime = time.perf_counter() - self.profiler.started_at
+        handled = HANDLER_SECONDS.count()
+        active = self.active_users.active(ACTIVE_USER_WINDOWS)
+        rss = resident_memory_bytes()
+        return "\n".join([
+            "Статистика бота",
+            f"Работает: {format_age(uptime)}, расписание {'загружено' if self.ready.is_set() else 'загружается'}",
+            f"Возраст расписания: своя группа {format_age(self.refresh_scheduler.age(DEFAULT_GROUP))}, "
+            f"самое старое из {refresh['groups']} групп {format_age(refresh['oldest_age'])}",
+            f"Обновления: {refresh['succeeded']} успешно ({refresh['changed']} с изменениями), "
+            f"{refresh['failed']} с ошибкой, {refresh['queue_depth']} в очереди",
+            "Попадания в кэш:",
+            *cache_lines,
+            f"Обработано сообщений: {handled} ({handled / max(uptime, 1) * 60:.1f} в минуту)",
+            "Время ответа: " + ", ".join(
+                f"p{q * 100:.0f} {format_latency(HANDLER_SECONDS.quantile(q))}" for q in (0.5, 0.95, 0.99)
+            ),
+            f"Очередь отправки: {self.send_queue.depth()}",
+            f"Активные пользователи: {active['1h']} за час, {active['24h']} за сутки",
+            f"Память (RSS): {rss / 2 ** 20:.1f} МБ" if rss is not None else "Память (RSS): нет данных",
+        ])
+
+    def handle_profile_signal(self, signum, frame):
+        # kill -USR1 <pid> samples the whole process, the result goes to the log, the profile directory and the admins
+        self.on_demand_profiler.start(
+            'sample', PROFILE_SIGNAL_SECONDS,
+            on_done=lambda summary, stats_path: self.send_profile(self.admin_ids, summary, stats_path)
+        )
+
+    def message_handler(self, **filters):
+        # Registers the handler with telebot and records its latency under the action it answers
+        def decorator(handler):
+            @functools.wraps(handler)
+            def timed(message):
+                action = ACTIONS_BY_TEXT.get(message.text, handler.__name__)
+                started = time.perf_counter()
+                if message.from_user is not None:  # Channel posts have no sender
+                    self.active_users.touch(message.from_user.id)
+                try:
+                    with TRACER.trace('dispatch', action=action, message_id=message.message_id), \
+                            self.on_demand_profiler.update():
+                        handler(message)
+                finally:
+                    HANDLER_SECONDS.observe(time.perf_counter() - started, action)
+
+            self.bot.message_handler(**filters)(timed)
+            return handler
+
+        return decorator
+
+    def register_metrics(self):
+        REGISTRY.gauge('bot_ready', "1 once the bot's own group is loaded", lambda: int(self.ready.is_set()))
+        REGISTRY.gauge('send_queue_depth', "Messages waiting in the send queue", self.send_queue.depth)
+        REGISTRY.gauge('reminders_pending', "Planned reminders", lambda: len(self.reminders.jobs))
+        REGISTRY.gauge('refresh_groups', "Groups kept fresh by the refresh scheduler",
+                       lambda: self.refresh_scheduler.metrics()['groups'])
+        REGISTRY.gauge('refresh_queue_depth', "Groups due for a refresh",
+                       lambda: self.refresh_scheduler.metrics()['queue_depth'])
+        REGISTRY.callback_counter('refresh_total', "Schedule refreshes by outcome", lambda: {
+            outcome: self.refresh_scheduler.metrics()[outcome] for outcome in ('succeeded', 'failed', 'changed')
+        }, ['outcome'])
+        REGISTRY.gauge('refresh_freshness_groups', "Groups by age of their cached schedule",
+                       lambda: self.refresh_scheduler.metrics()['freshness'], ['age'])
+        REGISTRY.gauge('startup_phase_seconds', "Time spent in each startup phase",
+                       lambda: dict(self.profiler.phases), ['phase'])
+        REGISTRY.gauge('active_users', "Users who sent a message within the window",
+                       lambda: self.active_users.active(ACTIVE_USER_WINDOWS), ['window'])
+        REGISTRY.gauge('process_resident_memory_bytes', "Resident memory of the bot process",
+                       lambda: resident_memory_bytes() or 0)
+        REGISTRY.gauge('startup_milestone_seconds', "Time from the start until each startup milestone",
+                       lambda: dict(self.profiler.marks), ['milestone'])
 
     def setup_bot(self):
-        @self.bot.message_handler(func=lambda message: message.text.lower() == "cat")
+        @self.message_handler(func=lambda message: not self.ready.is_set())
+        def queue_until_ready(message):
+            with self.pending_lock:
+                if not self.ready.is_set():
+                    self.pending_messages.append(message)
+                    queued = True
+                else:
+                    queued = False
+            if queued:
+                log_user_action(message, "is waiting for the schedule to load")
+                self.send_message(message.chat.id, ScheduleBotAction.LOADING_MESSAGE)
+            else:
+                self.bot.process_new_messages([message])
+
+        @self.message_handler(func=lambda message: message.text.lower() == "cat")
         def send_cat_image(message):
-            logging.info(f"User {message.from_user.username} (ID: {message.from_user.id}) requested a cat image. He found the easter egg!")
+            log_user_action(message, "requested a cat image. He found the easter egg!")
             with open(self.cat_image_path, 'rb') as cat_image:
-                self.bot.send_photo(message.chat.id, cat_image)
+                self.send_photo(message.chat.id, cat_image)
 
-        @self.bot.message_handler(commands=['start'])
+        @self.message_handler(commands=['start'])
         def start(message):
-            logging.info(f"User {message.from_user.username} (ID: {message.from_user.id}) started the bot.")
+            log_user_action(message, "started the bot.")
             show_main_menu(message.chat.id)
 
+        @self.message_handler(commands=['subscribe'])
+        def subscribe(message):
+            log_user_action(message, "subscribed to the digest.")
+            self.subscriptions.subscribe(message.chat.id, (DEFAULT_GROUP, self.subgroup, self.sub_subgroup))
+            self.send_message(message.chat.id, ScheduleBotAction.SUBSCRIBED_MESSAGE)
+
+        @self.message_handler(commands=['remind'])
+        def remind(message):
+            argument = message.text.partition(' ')[2].strip().lower()
+            if argument in ("off", "0"):
+                log_user_action(message, "disabled reminders.")
+                self.reminders.unsubscribe(message.chat.id)
+                self.send_message(message.chat.id, ScheduleBotAction.REMINDERS_OFF_MESSAGE)
+                return
+            if not argument.isdigit() or not 1 <= int(argument) <= MAX_REMINDER_MINUTES:
+                self.send_message(message.chat.id, ScheduleBotAction.REMIND_USAGE_MESSAGE)
+                return
+
+            minutes = int(argument)
+            log_user_action(message, "enabled reminders %s minutes before lectures.", minutes)
+            self.reminders.subscribe(message.chat.id, (DEFAULT_GROUP, self.subgroup, self.sub_subgroup), minutes)
+            self.send_message(message.chat.id, f"Буду напоминать о парах за {minutes} мин.")
+
+        @self.message_handler(commands=['teacher'])
+        def send_teacher_schedule(message):
+            query = message.text.partition(' ')[2].strip()
+            log_user_action(message, "looked up teacher '%s'", query)
+            name, _, week = query.rpartition(' ')
+            if week.isdigit() and name:
+                query, week = name, int(week)
+            else:
+                week = self.calendar.week()
+            if not query:
+                self.send_message(message.chat.id, ScheduleBotAction.TEACHER_USAGE_MESSAGE)
+                return
+
+            suggestions = []
+            with self.index_lock:
+                teacher_slots = self.teacher_index.lookup(query, week)
+                if not teacher_slots:
+                    suggestions = [text for _, _, text in self.search_index.search(query, kinds=('teacher',))]
+                    if suggestions:
+                        teacher_slots = self.teacher_index.lookup(suggestions[0], week)
+            if len(suggestions) > 1:
+                self.send_message(message.chat.id, f"Возможно, вы имели в виду: {', '.join(suggestions)}")
+            if not teacher_slots:
+                self.send_message(message.chat.id, ScheduleBotAction.TEACHER_NOT_FOUND_MESSAGE)
+                return
+
+            # The answer is read from these groups' schedules, asking for a teacher keeps them fresh
+            for group in {slot.group for slots in teacher_slots.values() for slot in slots}:
+                self.refresh_scheduler.record_request(group)
+
+            lectures_content = f"Неделя {week}\n\n{display_teacher_slots(teacher_slots, self.group_names)}"
+            for part in split_message(lectures_content):
+                self.send_message(message.chat.id, part, parse_mode='Markdown')
+
+        @self.message_handler(commands=['find'])
+        def send_search_results(message):
+            query = message.text.partition(' ')[2].strip()
+            log_user_action(message, "searched for '%s'", query)
+            if not query:
+                self.send_message(message.chat.id, ScheduleBotAction.FIND_USAGE_MESSAGE)
+                return
+
+            with self.index_lock:
+                results = self.search_index.search(query, limit=10)
+            if not results:
+                self.send_message(message.chat.id, ScheduleBotAction.NOTHING_FOUND_MESSAGE)
+                return
+
+            kind_names = {'teacher': "Преподаватель", 'subject': "Предмет", 'group': "Группа"}
+            self.send_message(message.chat.id, "\n".join(f"{kind_names[kind]}: {text}" for _, kind, text in results))
+
+        @self.message_handler(commands=['rooms'])
+        def send_free_rooms(message):
+            arguments = message.text.split()[1:]
+            log_user_action(message, "looked up free rooms %s", arguments)
+            day = parse_weekday(arguments[0]) if arguments else None
+            if not day or len(arguments) not in (2, 3) or not all(argument.isdigit() for argument in arguments[1:]):
+                self.send_message(message.chat.id, ScheduleBotAction.ROOMS_USAGE_MESSAGE)
+                return
+
+            slot = int(arguments[1])
+            week = int(arguments[2]) if len(arguments) == 3 else self.calendar.week()
+            with self.index_lock:
+                free_rooms = self.room_index.free_rooms(day, slot, week)
+                slot_time = self.room_index.slot_time(day, slot)
+            if free_rooms is None:
+                self.send_message(message.chat.id, ScheduleBotAction.ROOMS_SLOT_NOT_FOUND_MESSAGE)
+                return
+
+            header = f"Свободные аудитории: {day}, {slot}-я пара ({slot_time}), неделя {week}"
+            lectures_content = f"{header}\n\n{', '.join(free_rooms) or 'Нет свободных аудиторий'}"
+            for part in split_message(lectures_content):
+                self.send_message(message.chat.id, part)
+
+        @self.message_handler(commands=['unsubscribe'])
+        def unsubscribe(message):
+            log_user_action(message, "unsubscribed from the digest.")
+            if self.subscriptions.unsubscribe(message.chat.id):
+                self.send_message(message.chat.id, ScheduleBotAction.UNSUBSCRIBED_MESSAGE)
+            else:
+                self.send_message(message.chat.id, ScheduleBotAction.NOT_SUBSCRIBED_MESSAGE)
+
+        @self.message_handler(commands=['stats'], func=self.is_admin)
+        def stats(message):
+            log_user_action(message, "requested bot stats.")
+            for part in split_message(self.render_stats()):
+                self.send_message(message.chat.id, part)
+
+        @self.message_handler(commands=['profile'], func=self.is_admin)
+        def profile(message):
+            request = parse_profile_request(message.text.split()[1:])
+            if request is None:
+                self.send_message(message.chat.id, ScheduleBotAction.PROFILE_USAGE_MESSAGE)
+                return
+
+            mode, seconds, updates = request
+            log_user_action(message, "started profiling: %s for %s.", mode, f"{seconds}s" if seconds else f"{updates} updates")
+            started = self.on_demand_profiler.start(
+                mode, seconds, updates,
+                on_done=lambda summary, stats_path: self.send_profile([message.chat.id], summary, stats_path)
+            )
+            if not started:
+                self.send_message(message.chat.id, ScheduleBotAction.PROFILE_BUSY_MESSAGE)
+                return
+            limit = f"{seconds} с" if seconds else f"{updates} сообщений"
+            self.send_message(message.chat.id, ScheduleBotAction.PROFILE_STARTED_MESSAGE.format(mode=mode, limit=limit))
+
         def show_main_menu(chat_id: int):
             markup = types.ReplyKeyboardMarkup(resize_keyboard=True)
             button_day = types.KeyboardButton(ScheduleBotAction.GET_SCHEDULE_DAY)
             button_week = types.KeyboardButton(ScheduleBotAction.GET_SCHEDULE_WEEK)
             markup.add(button_day, button_week)
-            logging.info(f"Displaying main menu to user ID: {chat_id}")
-            self.bot.send_message(chat_id, ScheduleBotAction.WELCOME_MESSAGE, reply_markup=markup)
+            markup.add(types.KeyboardButton(ScheduleBotAction.NOW), types.KeyboardButton(ScheduleBotAction.NEXT_LECTURE))
+            MESSAGE_LOG.info("Displaying main menu", extra={"chat_id": chat_id})
+            self.send_message(chat_id, ScheduleBotAction.WELCOME_MESSAGE, reply_markup=markup)
+
+        @self.message_handler(func=lambda message: message.text == ScheduleBotAction.NOW)
+        def send_current_lecture(message):
+            log_user_action(message, "selected 'NOW'")
+            self.refresh_scheduler.record_request(DEFAULT_GROUP)
+            now = datetime.now()
+            day, lectures, starts = self.get_day_lectures(now.date())
+            current, _ = find_current_and_next(lectures, starts, now.hour * 60 + now.minute)
+
+            if current:
+                self.send_message(message.chat.id, display_lecture_info({day: [current]}), parse_mode='Markdown')
+            else:
+                self.send_message(message.chat.id, ScheduleBotAction.NO_CURRENT_LECTURE_MESSAGE)
+
+        @self.message_handler(func=lambda message: message.text == ScheduleBotAction.NEXT_LECTURE)
+        def send_next_lecture(message):
+            log_user_action(message, "selected 'NEXT_LECTURE'")
+            self.refresh_scheduler.record_request(DEFAULT_GROUP)
+            now = datetime.now()
+            minute = now.hour * 60 + now.minute
+            for offset in range(7):
+                day, lectures, starts = self.get_day_lectures(now.date() + timedelta(days=offset))
+                _, upcoming = find_current_and_next(lectures, starts, minute if offset == 0 else -1)
+                if upcoming:
+                    self.send_message(message.chat.id, display_lecture_info({day: [upcoming]}), parse_mode='Markdown')
+                    return
 
-        @self.bot.message_handler(func=lambda message: message.text == ScheduleBotAction.GET_SCHEDULE_WEEK)
+            self.send_message(message.chat.id, ScheduleBotAction.NO_NEXT_LECTURE_MESSAGE)
+
+        @self.message_handler(func=lambda message: message.text == ScheduleBotAction.GET_SCHEDULE_WEEK)
         def select_week_option(message):
-            logging.info(f"User {message.from_user.username} (ID: {message.from_user.id}) selected 'GET_SCHEDULE_WEEK'")
+            log_user_action(message, "selected 'GET_SCHEDULE_WEEK'")
             markup = types.ReplyKeyboardMarkup(row_width=3, resize_keyboard=True)
             markup.add(
                 types.KeyboardButton(ScheduleBotAction.CURRENT_WEEK),
@@ -237,51 +1004,72 @@ class ScheduleBot:
                 types.KeyboardButton(ScheduleBotAction.SPECIFIC_WEEK)
             )
             markup.add(types.KeyboardButton(ScheduleBotAction.BACK))
-            self.bot.send_message(
+            self.send_message(
                 message.chat.id, ScheduleBotAction.CHOOSE_WEEK_MESSAGE, reply_markup=markup
             )
 
-        @self.bot.message_handler(func=lambda message: message.text == ScheduleBotAction.SPECIFIC_WEEK)
+        @self.message_handler(func=lambda message: message.text == ScheduleBotAction.SPECIFIC_WEEK)
         def prompt_specific_week(message):
-            logging.info(f"User {message.from_user.username} (ID: {message.from_user.id}) selected 'SPECIFIC_WEEK'")
-            self.bot.send_message(message.chat.id, ScheduleBotAction.ENTER_WEEK_MESSAGE)
+            log_user_action(message, "selected 'SPECIFIC_WEEK'")
+            self.send_message(message.chat.id, ScheduleBotAction.ENTER_WEEK_MESSAGE)
 
-        @self.bot.message_handler(func=lambda message: message.text == ScheduleBotAction.GET_SCHEDULE_DAY)
+        @self.message_handler(func=lambda message: message.text == ScheduleBotAction.GET_SCHEDULE_DAY)
         def select_day(message):
-            logging.info(f"User {message.from_user.username} (ID: {message.from_user.id}) selected 'GET_SCHEDULE_DAY'")
+            log_user_action(message, "selected 'GET_SCHEDULE_DAY'")
             markup = types.ReplyKeyboardMarkup(row_width=2, resize_keyboard=True)
-            days = ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота"]
-            buttons = [types.KeyboardButton(day) for day in days]
+            buttons = [types.KeyboardButton(day) for day in WEEKDAYS]
+            markup.add(types.KeyboardButton(ScheduleBotAction.TODAY), types.KeyboardButton(ScheduleBotAction.TOMORROW))
             markup.add(*buttons)
             markup.add(types.KeyboardButton(ScheduleBotAction.BACK))
-            self.bot.send_message(message.chat.id, ScheduleBotAction.CHOOSE_DAY_MESSAGE, reply_markup=markup)
+            self.send_message(message.chat.id, ScheduleBotAction.CHOOSE_DAY_MESSAGE, reply_markup=markup)
 
-        @self.bot.message_handler(
-            func=lambda message: message.text in ["понедельник", "вторник", "среда", "четверг", "пятница", "суббота"]
+        @self.message_handler(
+            func=lambda message: message.text in WEEKDAYS
         )
         def send_schedule_for_day(message):
-            logging.info(
-                f"User {message.from_user.username} (ID: {message.from_user.id}) requested schedule for {message.text}"
-            )
+            log_user_action(message, "requested schedule for %s", message.text)
 
+            self.refresh_scheduler.record_request(DEFAULT_GROUP)
             lectures_content = "Расписание не найдено"
-            if self.cached_schedule_table:
-                lecture_info = extract_lecture_info(
-                    self.cached_schedule_table, self.week, self.subgroup, self.sub_subgroup
-                )
-                day_schedule = lecture_info.get(message.text)
-                if day_schedule:
+            day_schedule = self.get_lecture_info(self.calendar.week()).get(message.text)
+            if day_schedule:
+                with TRACER.span('render', day=message.text):
                     lectures_content = display_lecture_info({message.text: day_schedule})
 
-            max_message_length = 4096
-            for i in range(0, len(lectures_content), max_message_length):
-                part = lectures_content[i:i + max_message_length]
-                self.bot.send_message(message.chat.id, part, parse_mode='Markdown')
+            for part in split_message(lectures_content):
+                self.send_message(message.chat.id, part, parse_mode='Markdown')
+
+            log_user_action(message, "received the day schedule")
+
+        def send_schedule_for_date(chat_id, date):
+            self.refresh_scheduler.record_request(DEFAULT_GROUP)
+            day, day_schedule, _ = self.get_day_lectures(date)
+            header = f"{date.strftime('%d.%m.%Y')}, неделя {self.calendar.week(date)}"
+            if day_schedule:
+                with TRACER.span('render', day=day):
+                    lectures_content = f"{header}\n\n{display_lecture_info({day: day_schedule})}"
+            else:
+                lectures_content = f"{header}\n\nЗанятий нет"
+
+            for part in split_message(lectures_content):
+                self.send_message(chat_id, part, parse_mode='Markdown')
 
-            logging.info(
-                f"Completed schedule response to user {message.from_user.username} (ID: {message.from_user.id})")
+        @self.message_handler(
+            func=lambda message: message.text in [ScheduleBotAction.TODAY, ScheduleBotAction.TOMORROW]
+        )
+        def send_schedule_for_today_or_tomorrow(message):
+            log_user_action(message, "requested schedule for %s", message.text)
+            date = datetime.now().date()
+            if message.text == ScheduleBotAction.TOMORROW:
+                date += timedelta(days=1)
+            send_schedule_for_date(message.chat.id, date)
+
+        @self.message_handler(func=lambda message: parse_user_date(message.text, datetime.now()) is not None)
+        def send_schedule_for_specific_date(message):
+            log_user_action(message, "requested schedule for %s", message.text)
+            send_schedule_for_date(message.chat.id, parse_user_date(message.text, datetime.now()))
 
-        @self.bot.message_handler(
+        @self.message_handler(
             func=lambda message: message.text in [
                 ScheduleBotAction.CURRENT_WEEK,
                 ScheduleBotAction.NEXT_WEEK,
@@ -289,74 +1077,131 @@ class ScheduleBot:
             ]
         )
         def send_schedule_for_week(message):
-            logging.info(
-                f"User {message.from_user.username} (ID: {message.from_user.id}) requested schedule for {message.text}"
-            )
+            log_user_action(message, "requested schedule for %s", message.text)
 
-            week = get_current_week()
-            if message.text == ScheduleBotAction.CURRENT_WEEK:
-                week = get_current_week()
-            elif message.text == ScheduleBotAction.NEXT_WEEK:
-                week = get_current_week() + 1
+            week = self.calendar.week()
+            if message.text == ScheduleBotAction.NEXT_WEEK:
+                week += 1
             elif message.text == ScheduleBotAction.PREVIOUS_WEEK:
-                week = max(1, get_current_week() - 1)
+                week = max(1, week - 1)
 
-            lectures_content = "Расписание не найдено"
-            if self.cached_schedule_table:
-                lecture_info = extract_lecture_info(
-                    self.cached_schedule_table, week, self.subgroup, self.sub_subgroup
-                )
-                if lecture_info:
-                    lectures_content = display_lecture_info(lecture_info)
-
-            max_message_length = 4096
-            for i in range(0, len(lectures_content), max_message_length):
-                part = lectures_content[i:i + max_message_length]
-                self.bot.send_message(message.chat.id, part, parse_mode='Markdown')
-
-            logging.info(
-                f"Completed weekly schedule response to user {message.from_user.username} (ID: {message.from_user.id})")
-
-        @self.bot.message_handler(func=lambda message: message.text.lstrip('-').isdigit())
+            self.refresh_scheduler.record_request(DEFAULT_GROUP)
+            for part in self.get_week_parts(week):
+                self.send_message(message.chat.id, part, parse_mode='Markdown')
+
+            log_user_action(message, "received the weekly schedule")
+
+        @self.message_handler(func=lambda message: message.text.lstrip('-').isdigit())
         def send_schedule_for_specific_week(message):
             week = int(message.text)
-            if week < 1:
-                logging.warning(
-                    f"User {message.from_user.username} (ID: {message.from_user.id}) entered invalid week number: {week}")
-                self.bot.send_message(message.chat.id, "Введите корректный номер недели (например, 20)")
+            if not 1 <= week <= MAX_WEEK:
+                log_user_action(message, "entered invalid week number: %s", week, level=logging.WARNING)
+                self.send_message(message.chat.id, "Введите корректный номер недели (например, 20)")
                 return
 
-            lectures_content = "Расписание не найдено"
-            if self.cached_schedule_table:
-                lecture_info = extract_lecture_info(
-                    self.cached_schedule_table, week, self.subgroup, self.sub_subgroup
-                )
-                if lecture_info:
-                    lectures_content = display_lecture_info(lecture_info)
-
-            logging.info(
-                f"Sending schedule for week {week} to user {message.from_user.username} (ID: {message.from_user.id})")
-
-            max_message_length = 4096
-            for i in range(0, len(lectures_content), max_message_length):
-                part = lectures_content[i:i + max_message_length]
-                self.bot.send_message(message.chat.id, part, parse_mode='Markdown')
-
-        @self.bot.message_handler(func=lambda message: message.text == ScheduleBotAction.BACK)
+            self.refresh_scheduler.record_request(DEFAULT_GROUP)
+            log_user_action(message, "requested the schedule for week %s", week)
+
+            for part in self.get_week_parts(week):
+                self.send_message(message.chat.id, part, parse_mode='Markdown')
+
+        @self.message_handler(func=lambda message: message.text == ScheduleBotAction.BACK)
         def back_to_main_menu(message):
-            logging.info(f"User {message.from_user.username} (ID: {message.from_user.id}) selected 'BACK' option")
+            log_user_action(message, "selected 'BACK' option")
             show_main_menu(message.chat.id)
 
+    def load_other_groups(self):
+        group_forms = [group_form for group_form in self.group_forms if group_form['group'] != DEFAULT_GROUP]
+        if self.crawl_catalog:
+            known = {group_form['group'] for group_form in group_forms} | {DEFAULT_GROUP}
+            catalog = self.crawler.discover_catalog()
+            self.group_names.update((group_form['group'], group_form['name']) for group_form in catalog)
+            group_forms += [group_form for group_form in catalog if group_form['group'] not in known]
+            self.group_forms_by_id.update((group_form['group'], group_form) for group_form in group_forms)
+
+        for group_form, html_doc in self.crawler.fetch_schedules(group_forms, self.calendar.week()):
+            self.load_group_page(group_form['group'], html_doc)
+
+    def set_ready(self):
+        with self.pending_lock:
+            if self.ready.is_set():
+                return
+            self.ready.set()
+            pending_messages, self.pending_messages = self.pending_messages, []
+        self.profiler.mark('ready')
+        if pending_messages:
+            logging.info(f"Answering {len(pending_messages)} messages received while loading")
+            self.bot.process_new_messages(pending_messages)
+
+    def load_schedules(self):
+        with self.profiler.phase('store_load'):
+            self.restore_groups()
+        if self.has_schedule():
+            self.set_ready()  # Answers come from the stored schedule while the fresh page is fetched
+
+        fetched = False
+        try:
+            with self.profiler.phase('fetch'):
+                html_doc = fetch_data(self.website_url, self.calendar.week())
+            self.load_group_page(DEFAULT_GROUP, html_doc)
+            self.profiler.mark('first_fetch')
+            fetched = True
+        except Exception as e:
+            # Answer with what we have and let the refresh scheduler keep trying
+            logging.error(f"Initial fetch failed, serving the stored schedule if any until a refresh succeeds: {e}")
+        self.set_ready()
+
+        scheduled = self.schedule_loaded_groups()
+        if not fetched:
+            self.refresh_scheduler.add_group(DEFAULT_GROUP, refreshed_at=1)  # Due right away
+            scheduled.add(DEFAULT_GROUP)
+        # A catalog crawl takes minutes, reminders and refreshes of the bot's group do not wait for it
+        self.reminders.start()
+        self.refresh_scheduler.start()
+        self.prefetcher.start()
+
+        try:
+            with self.profiler.phase('crawl'):
+                self.load_other_groups()
+        except Exception as e:
+            logging.error(f"Loading the other groups failed, keeping the ones loaded so far: {e}")
+        self.schedule_loaded_groups(skip=scheduled)
+        self.export_snapshot()
+        self.profiler.mark('all_groups_loaded')
+        self.profiler.finish()
+
+    def schedule_loaded_groups(self, skip=()):
+        # Hands the loaded groups to the refresh scheduler -> the groups handed over.
+        # Stored groups gone from the catalog are not fetched
+        groups = {group for group in list(self.schedule_groups) if group in self.group_forms_by_id and group not in skip}
+        for group in groups:
+            self.refresh_scheduler.add_group(group)
+        return groups
+
+    def wrap_get_updates(self):
+        # Updates are seen here once, messages queued during startup are dispatched a second time later
+        get_updates = self.bot.get_updates
+
+        def get_updates_wrapped(*args, **kwargs):
+            updates = get_updates(*args, **kwargs)
+            self.profiler.mark('first_poll')
+            if self.update_recorder and updates:
+                self.update_recorder.record(updates)
+            return updates
+
+        self.bot.get_updates = get_updates_wrapped
+
     def run(self):
-        start_time = time.time()
         logging.info("Bot is starting up")
 
-        html_doc = fetch_data(self.website_url, self.week)
-        self.cached_schedule_table = parse_html(html_doc)
-
         self.setup_bot()
+        self.send_queue.start()
+        self.digest.start()
+        threading.Thread(target=self.load_schedules, name="startup-loader", daemon=True).start()
+        # Signal handlers can only be installed from the main thread, a bot run from a harness thread goes without
+        if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGUSR1, self.handle_profile_signal)
 
-        end_time = time.time()
-        logging.info(f"Bot setup complete. Initialization time: {end_time - start_time:.2f} seconds")
-
+        self.wrap_get_updates()
+        self.profiler.mark('polling')
         self.bot.infinity_polling()
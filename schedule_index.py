@@ -0,0 +1,142 @@
+import re
+from collections import defaultdict, namedtuple
+
+
+TeacherSlot = namedtuple('TeacherSlot', ['group', 'weeks', 'day', 'time', 'room', 'subject', 'start'])
+
+
+def normalize_name(name):
+    name = name.lower().replace('ё', 'е')
+    return ' '.join(re.findall(r'\w+', name))
+
+
+class TeacherIndex:
+    def __init__(self):
+        self.slots = defaultdict(list)  # normalized teacher name -> [TeacherSlot]
+        self.names = {}  # normalized teacher name -> name as printed on the site
+        self.by_surname = defaultdict(set)  # surname -> normalized teacher names
+        self.group_names = defaultdict(set)  # group -> normalized teacher names with slots from that group
+
+    def update_group(self, group, lectures):
+        self.remove_group(group)
+        for lecture in lectures:
+            name = normalize_name(lecture['Teacher'])
+            if not name:
+                continue
+            self.slots[name].append(TeacherSlot(
+                group, lecture['Weeks'], lecture['Day'], lecture['Time'], lecture['Classroom'],
+                lecture['Subject'], lecture['Start']
+            ))
+            self.names.setdefault(name, lecture['Teacher'])
+            self.by_surname[name.split()[0]].add(name)
+            self.group_names[group].add(name)
+
+    def remove_group(self, group):
+        for name in self.group_names.pop(group, ()):
+            slots = [slot for slot in self.slots[name] if slot.group != group]
+            if slots:
+                self.slots[name] = slots
+            else:
+                del self.slots[name]
+                del self.names[name]
+                self.by_surname[name.split()[0]].discard(name)
+
+    def find_names(self, query):
+        query = normalize_name(query)
+        if not query:
+            return []
+        if query in self.slots:
+            return [query]
+        surname, _, initials = query.partition(' ')
+        return sorted(name for name in self.by_surname.get(surname, ()) if name.startswith(query) or not initials)
+
+    def lookup(self, query, week=None):
+        result = {}
+        for name in self.find_names(query):
+            slots = self.slots[name]
+            if week is not None:
+                slots = [slot for slot in slots if slot.weeks >> week & 1]
+            result[self.names[name]] = slots
+        return result
+
+
+class RoomIndex:
+    def __init__(self):
+        self.contributions = defaultdict(lambda: defaultdict(dict))  # (day, start) -> room -> group -> week mask
+        self.occupancy = defaultdict(dict)  # (day, start) -> room -> week mask of all groups
+        self.group_keys = defaultdict(set)  # group -> (day, start, room) it occupies
+        self.room_counts = defaultdict(int)  # room -> number of (day, start, group) entries using it
+        self.slot_starts = defaultdict(list)  # day -> sorted distinct start minutes, slot N is slot_starts[day][N - 1]
+        self.times = {}  # (day, start) -> time slot as printed on the site
+        self.occupied_cache = {}  # (day, start, week) -> occupied rooms
+
+    @property
+    def rooms(self):
+        return self.room_counts.keys()
+
+    def update_group(self, group, lectures):
+        touched = self._remove_contributions(group)
+        for lecture in lectures:
+            room = lecture['Classroom']
+            if not room or lecture['Start'] is None or not lecture['Weeks']:
+                continue  # A lecture on no week (empty cell, reversed range) occupies nothing
+            key = (lecture['Day'], lecture['Start'])
+            groups = self.contributions[key][room]
+            if group not in groups:
+                self.room_counts[room] += 1
+                self.group_keys[group].add((*key, room))
+            groups[group] = groups.get(group, 0) | lecture['Weeks']
+            self.times.setdefault(key, lecture['Time'])
+            touched.add((*key, room))
+        self._refresh(touched)
+
+    def remove_group(self, group):
+        self._refresh(self._remove_contributions(group))
+
+    def _remove_contributions(self, group):
+        touched = self.group_keys.pop(group, set())
+        for day, start, room in touched:
+            del self.contributions[(day, start)][room][group]
+            self.room_counts[room] -= 1
+            if not self.room_counts[room]:
+                del self.room_counts[room]
+        return touched
+
+    def _refresh(self, touched):
+        for day, start, room in touched:
+            key = (day, start)
+            groups = self.contributions[key].get(room)
+            mask = 0
+            for weeks in (groups or {}).values():
+                mask |= weeks
+            if mask:
+                self.occupancy[key][room] = mask
+            else:
+                self.occupancy[key].pop(room, None)
+                self.contributions[key].pop(room, None)
+            if not self.occupancy[key]:
+                del self.occupancy[key]
+                del self.contributions[key]
+                self.times.pop(key, None)
+
+        self.slot_starts = defaultdict(list)
+        for day, start in sorted(self.occupancy):
+            self.slot_starts[day].append(start)
+        self.occupied_cache = {}
+
+    def slot_time(self, day, slot):
+        starts = self.slot_starts.get(day, [])
+        if not 1 <= slot <= len(starts):
+            return None
+        return self.times[(day, starts[slot - 1])]
+
+    def free_rooms(self, day, slot, week):
+        starts = self.slot_starts.get(day, [])
+        if not 1 <= slot <= len(starts):
+            return None
+        key = (day, starts[slot - 1], week)
+        occupied = self.occupied_cache.get(key)
+        if occupied is None:
+            occupied = {room for room, weeks in self.occupancy[key[:2]].items() if weeks >> week & 1}
+            self.occupied_cache[key] = occupied
+        return sorted(self.rooms - occupied)
@@ -0,0 +1,323 @@
+import argparse
+import logging
+import mmap
+import os
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from schedule_store import ScheduleStore, week_lecture_info
+
+
+# Layout, little endian: header, string index, string data, week masks, group records sorted by code, lecture records.
+# Readers map the file and unpack records where they are, a new version is written next to it and renamed over it
+SNAPSHOT_MAGIC = b'BGEUSNAP'
+SNAPSHOT_VERSION = 1
+# magic, version, u64 words per week mask, created at, group/string/lecture/mask counts, offsets of the five sections
+HEADER = struct.Struct('<8sHHdIIIIIIIII')
+STRING_ENTRY = struct.Struct('<II')  # offset into the string data, length in bytes
+GROUP_RECORD = struct.Struct('<IIIIB3x')  # code, page hash, first lecture, lecture count, has table
+LECTURE_RECORD = struct.Struct('<7Ihh')  # day, time, subgroup, subject, teacher, room, week mask, start, end
+MASK_WORD = struct.Struct('<Q')
+NO_MINUTE = -1  # Start or end of a lecture whose time slot could not be parsed
+SNAPSHOT_EXPORT_DELAY_SECONDS = 30  # Changes requested within this time of the first one share a single export
+
+
+def write_snapshot(path, groups):
+    # groups: (code, page hash, whether the page had a schedule table, extract_all_lectures records)
+    strings = {}
+    masks = {}
+
+    def string_id(value):
+        return strings.setdefault(value or '', len(strings))
+
+    group_records = []
+    lecture_records = []
+    for code, page_hash, has_table, lectures in sorted(groups, key=lambda group: group[0]):
+        group_records.append((string_id(code), string_id(page_hash), len(lecture_records), len(lectures or ()),
+                              has_table))
+        for lecture in lectures or ():
+            lecture_records.append((
+                string_id(lecture['Day']), string_id(lecture['Time']), string_id(lecture['Subgroup']),
+                string_id(lecture['Subject']), string_id(lecture['Teacher']), string_id(lecture['Classroom']),
+                masks.setdefault(lecture['Weeks'], len(masks)),
+                NO_MINUTE if lecture['Start'] is None else lecture['Start'],
+                NO_MINUTE if lecture['End'] is None else lecture['End'],
+            ))
+
+    mask_words = max([1] + [(mask.bit_length() + 63) // 64 for mask in masks])
+    encoded = [value.encode('utf-8') for value in strings]
+    string_index = bytearray()
+    offset = 0
+    for data in encoded:
+        string_index += STRING_ENTRY.pack(offset, len(data))
+        offset += len(data)
+    string_data = b''.join(encoded)
+    mask_data = b''.join(
+        MASK_WORD.pack(mask >> (64 * word) & 0xFFFFFFFFFFFFFFFF) for mask in masks for word in range(mask_words)
+    )
+    group_data = b''.join(GROUP_RECORD.pack(*record) for record in group_records)
+    lecture_data = b''.join(LECTURE_RECORD.pack(*record) for record in lecture_records)
+
+    offsets = []
+    offset = HEADER.size
+    for section in (string_index, string_data, mask_data, group_data):
+        offsets.append(offset)
+        offset += len(section)
+    offsets.append(offset)
+    header = HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, mask_words, time.time(), len(group_records), len(strings),
+                         len(lecture_records), len(masks), *offsets)
+
+    # A temporary file of its own in the same directory, so the rename is atomic and writers never share one
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(path)}.", suffix='.tmp',
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for section in (header, string_index, string_data, mask_data, group_data, lecture_data):
+                f.write(section)
+        os.chmod(tmp_path, 0o644)  # mkstemp creates it private, readers may run as other users
+        # Processes still mapping the old file keep reading it until they reopen
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def export_store(store, path):
+    write_snapshot(path, [
+        (group, page_hash, has_table, store.lectures(group) if has_table else None)
+        for group, (page_hash, has_table, _) in store.groups().items()
+    ])
+
+
+class SnapshotExporter:
+    # Writes the store's snapshot on one background thread. Requests made while an export is pending are merged,
+    # so groups changing together rewrite the file once and two exports never run at the same time
+    def __init__(self, store, path, delay=SNAPSHOT_EXPORT_DELAY_SECONDS):
+        self.store = store
+        self.path = path
+        self.delay = delay
+        self.requested = threading.Event()
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def request(self):
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="snapshot-exporter", daemon=True)
+                self.thread.start()
+        self.requested.set()
+
+    def _run(self):
+        while True:
+            self.requested.wait()
+            time.sleep(self.delay)
+            self.requested.clear()  # A change from now on asks for the next export
+            try:
+                export_store(self.store, self.path)
+            except (sqlite3.Error, OSError) as e:
+                logging.error(f"Failed to write the schedule snapshot {self.path}: {e}")
+
+
+class ScheduleSnapshot:
+    # Read-only view of a snapshot file. Opening maps it and reads the header, records are unpacked on access
+    # and pages come from the page cache, shared by every process mapping the same file
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError(f"{path} is not a schedule snapshot")
+        (magic, version, self.mask_words, self.created_at, self.group_count, self.string_count, self.lecture_count,
+         self.mask_count, self.string_index_offset, self.string_data_offset, self.mask_offset, self.group_offset,
+         self.lecture_offset) = HEADER.unpack_from(self.map)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a schedule snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"{path} has snapshot version {version}, expected {SNAPSHOT_VERSION}")
+        self.strings = {}  # string id -> decoded string, filled as strings are read
+
+    def string(self, string_id):
+        value = self.strings.get(string_id)
+        if value is None:
+            offset, length = STRING_ENTRY.unpack_from(self.map, self.string_index_offset + string_id * STRING_ENTRY.size)
+            start = self.string_data_offset + offset
+            value = self.strings[string_id] = self.map[start:start + length].decode('utf-8')
+        return value
+
+    def group_record(self, index):
+        return GROUP_RECORD.unpack_from(self.map, self.group_offset + index * GROUP_RECORD.size)
+
+    def find_group(self, code):
+        # Binary search over the sorted group records -> (first lecture, lecture count, has table) or None
+        low, high = 0, self.group_count
+        while low < high:
+            middle = (low + high) // 2
+            code_id, _, first, count, has_table = self.group_record(middle)
+            middle_code = self.string(code_id)
+            if middle_code == code:
+                return first, count, bool(has_table)
+            if middle_code < code:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def in_week(self, mask_index, week):
+        word = week // 64
+        if week < 0 or word >= self.mask_words:
+            return False
+        offset = self.mask_offset + (mask_index * self.mask_words + word) * MASK_WORD.size
+        return bool(MASK_WORD.unpack_from(self.map, offset)[0] >> (week % 64) & 1)
+
+    def mask(self, mask_index):
+        offset = self.mask_offset + mask_index * self.mask_words * MASK_WORD.size
+        return sum(MASK_WORD.unpack_from(self.map, offset + word * MASK_WORD.size)[0] << (64 * word)
+                   for word in range(self.mask_words))
+
+    def lecture_records(self, group):
+        found = self.find_group(group)
+        if found is None:
+            return
+        first, count, _ = found
+        for index in range(first, first + count):
+            yield LECTURE_RECORD.unpack_from(self.map, self.lecture_offset + index * LECTURE_RECORD.size)
+
+    def groups(self):
+        # -> {group: (page hash, whether the page had a schedule table, time the snapshot was written)}, like the store
+        groups = {}
+        for index in range(self.group_count):
+            code_id, hash_id, _, _, has_table = self.group_record(index)
+            groups[self.string(code_id)] = (self.string(hash_id) or None, bool(has_table), self.created_at)
+        return groups
+
+    def lectures(self, group):
+        return [{
+            'Day': self.string(day) or None,
+            'Weeks': self.mask(mask_index),
+            'Subgroup': self.string(subgroup),
+            'Time': self.string(time_slot),
+            'Start': None if start == NO_MINUTE else start,
+            'End': None if end == NO_MINUTE else end,
+            'Subject': self.string(subject),
+            'Teacher': self.string(teacher),
+            'Classroom': self.string(room),
+        } for day, time_slot, subgroup, subject, teacher, room, mask_index, start, end in self.lecture_records(group)]
+
+    def lecture_info(self, group, week, subgroup, sub_subgroup):
+        # Same result as ScheduleStore.lecture_info
+        return week_lecture_info((
+            (self.string(day) or None, self.string(time_slot), None if start == NO_MINUTE else start,
+             None if end == NO_MINUTE else end, self.string(language_group), self.string(subject),
+             self.string(teacher), self.string(room))
+            for day, time_slot, language_group, subject, teacher, room, mask_index, start, end
+            in self.lecture_records(group) if self.in_week(mask_index, week)
+        ), subgroup, sub_subgroup)
+
+    def close(self):
+        self.map.close()
+
+
+def mapping_memory(path):
+    # -> (Rss, Pss) in KiB of this process's mappings of path, from /proc/self/smaps (Linux only)
+    path = os.path.realpath(path)
+    rss = pss = 0
+    inside = False
+    with open('/proc/self/smaps', encoding='utf-8') as f:
+        for line in f:
+            fields = line.split()
+            if fields and '-' in fields[0] and len(fields) >= 5:
+                inside = len(fields) >= 6 and fields[5] == path
+            elif inside and fields[0] == 'Rss:':
+                rss += int(fields[1])
+            elif inside and fields[0] == 'Pss:':
+                pss += int(fields[1])
+    return rss, pss
+
+
+def touch(path):
+    # Child of `shared`: maps the snapshot, reads every page, then reports its Rss and Pss once the parent asks
+    snapshot = ScheduleSnapshot(path)
+    sum(snapshot.map[offset] for offset in range(0, len(snapshot.map), mmap.PAGESIZE))
+    print("ready", flush=True)
+    sys.stdin.readline()
+    rss, pss = mapping_memory(path)
+    print(f"{rss} {pss}", flush=True)
+    sys.stdin.readline()  # Stays mapped until every reader has reported
+
+
+def shared(path, processes):
+    # Pss splits a shared page between the processes mapping it, so Pss close to Rss / processes proves sharing
+    children = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), 'touch', path],
+                         stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+        for _ in range(processes)
+    ]
+    for child in children:
+        if child.stdout.readline().strip() != "ready":
+            raise SystemExit("A reader failed to map the snapshot")
+    for child in children:
+        child.stdin.write("report\n")
+        child.stdin.flush()
+    results = [tuple(map(int, child.stdout.readline().split())) for child in children]
+    for child in children:
+        child.stdin.close()
+        child.wait()
+
+    size = os.path.getsize(path) / 1024
+    print(f"{path}: {size:.0f} KiB mapped by {processes} processes")
+    for i, (rss, pss) in enumerate(results):
+        print(f"  reader {i}: Rss {rss} KiB, Pss {pss} KiB")
+    total_rss = sum(rss for rss, _ in results)
+    total_pss = sum(pss for _, pss in results)
+    print(f"  together: Rss {total_rss} KiB, Pss {total_pss} KiB, "
+          f"{total_rss / max(total_pss, 1):.1f}x less memory than private copies")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write, query and check memory-mapped schedule snapshots")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export_parser = commands.add_parser('export', help="Write a snapshot of the schedule store")
+    export_parser.add_argument('store', nargs='?', default="schedules.db")
+    export_parser.add_argument('path', nargs='?', default="schedules.snap")
+    query_parser = commands.add_parser('query', help="Print a group's week, lists the groups without --group")
+    query_parser.add_argument('path', nargs='?', default="schedules.snap")
+    query_parser.add_argument('--group')
+    query_parser.add_argument('--week', type=int)
+    query_parser.add_argument('--subgroup', default="1 подгр")
+    query_parser.add_argument('--sub-subgroup', default="1 подгр")
+    shared_parser = commands.add_parser('shared', help="Show that readers in several processes share the pages")
+    shared_parser.add_argument('path', nargs='?', default="schedules.snap")
+    shared_parser.add_argument('--processes', type=int, default=4)
+    touch_parser = commands.add_parser('touch')
+    touch_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_store(ScheduleStore(args.store), args.path)
+        print(f"Wrote {args.path}: {ScheduleSnapshot(args.path).group_count} groups, "
+              f"{os.path.getsize(args.path) / 1024:.0f} KiB")
+    elif args.command == 'query':
+        snapshot = ScheduleSnapshot(args.path)
+        if args.group is None:
+            for group in sorted(snapshot.groups()):
+                print(group)
+        elif args.week is None:
+            parser.error("--week is required with --group")
+        else:
+            from schedule_bot import display_lecture_info  # Only the printing needs the bot module
+            print(display_lecture_info(snapshot.lecture_info(args.group, args.week, args.subgroup, args.sub_subgroup)))
+    elif args.command == 'shared':
+        if not os.path.exists('/proc/self/smaps'):
+            raise SystemExit("Needs /proc/self/smaps, Linux only")
+        shared(args.path, args.processes)
+    else:
+        touch(args.path)
+
+
+if __name__ == '__main__':
+    main()
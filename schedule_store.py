@@ -0,0 +1,231 @@
+import argparse
+import logging
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT_SECONDS = 5  # How long a writer waits for another process holding the write lock
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS groups (
+    id INTEGER PRIMARY KEY,
+    code TEXT NOT NULL UNIQUE,
+    page_hash TEXT,
+    has_table INTEGER NOT NULL,  -- 0 when the group's page had no schedule table
+    refreshed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS subjects (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS teachers (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS rooms (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE);
+CREATE TABLE IF NOT EXISTS week_masks (
+    id INTEGER PRIMARY KEY,
+    mask TEXT NOT NULL UNIQUE  -- Hex, a range like 1-100 does not fit a 64-bit integer
+);
+CREATE TABLE IF NOT EXISTS lectures (
+    id INTEGER PRIMARY KEY,
+    group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,  -- Order on the page
+    day TEXT NOT NULL,  -- '' for rows before the first day header
+    time TEXT NOT NULL,
+    start INTEGER,
+    "end" INTEGER,
+    subgroup TEXT NOT NULL,  -- Language group of a split lecture, '' for the whole group
+    subject_id INTEGER NOT NULL REFERENCES subjects(id),
+    teacher_id INTEGER NOT NULL REFERENCES teachers(id),
+    room_id INTEGER NOT NULL REFERENCES rooms(id),
+    mask_id INTEGER NOT NULL REFERENCES week_masks(id),
+    UNIQUE (group_id, position)
+);
+-- One row per lecture and week it takes place on, the covering index of (group, week, day) lookups
+CREATE TABLE IF NOT EXISTS lecture_weeks (
+    group_id INTEGER NOT NULL REFERENCES groups(id) ON DELETE CASCADE,
+    week INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    lecture_id INTEGER NOT NULL REFERENCES lectures(id) ON DELETE CASCADE,
+    PRIMARY KEY (group_id, week, day, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS lectures_by_teacher ON lectures (teacher_id, group_id);
+CREATE INDEX IF NOT EXISTS lectures_by_room ON lectures (room_id, day, start);
+"""
+LECTURE_COLUMNS = """
+    l.day, l.time, l.start, l."end", l.subgroup, s.name, t.name, r.name, m.mask
+    FROM lectures l
+    JOIN subjects s ON s.id = l.subject_id
+    JOIN teachers t ON t.id = l.teacher_id
+    JOIN rooms r ON r.id = l.room_id
+    JOIN week_masks m ON m.id = l.mask_id
+"""
+
+
+def mask_weeks(mask):
+    week = 0
+    while mask:
+        if mask & 1:
+            yield week
+        mask >>= 1
+        week += 1
+
+
+def week_lecture_info(rows, subgroup, sub_subgroup):
+    # rows: (day, time, start, end, language group, subject, teacher, classroom) of a week in page order
+    # -> {day: [lecture]} as extract_lecture_info builds it
+    lecture_info = defaultdict(list)
+    for day, time_slot, start, end, language_group, subject, teacher, classroom in rows:
+        if language_group and subgroup not in language_group and sub_subgroup not in language_group:
+            continue
+        lecture = {
+            'Time': time_slot,
+            'Start': start,
+            'End': end,
+            'Subject': subject,
+            'Teacher': teacher,
+            'Classroom': classroom
+        }
+        lectures = lecture_info[day]
+        if lecture not in lectures:
+            lectures.append(lecture)
+
+    for lectures in lecture_info.values():
+        lectures.sort(key=lambda lecture: (lecture['Start'] is None, lecture['Start'] or 0))  # Untimed last
+    return lecture_info
+
+
+class ScheduleStore:
+    # Lectures of every known group in SQLite. WAL mode lets other processes read while the bot writes,
+    # every thread gets its own connection
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        connection = self.connection()
+        # Checked before any change, a database of another schema version is left as it is
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise RuntimeError(f"{path} has schema version {version}, expected {SCHEMA_VERSION}")
+        connection.execute("PRAGMA journal_mode=WAL")
+        with connection:
+            connection.executescript(SCHEMA)
+            connection.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS)
+            connection.execute("PRAGMA foreign_keys=ON")
+            connection.execute("PRAGMA synchronous=NORMAL")  # Durable across process crashes, enough for a cache
+        return connection
+
+    @staticmethod
+    def _intern(connection, table, value, ids):
+        key = (table, value)
+        if key not in ids:
+            connection.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (value,))
+            ids[key] = connection.execute(f"SELECT id FROM {table} WHERE name = ?", (value,)).fetchone()[0]
+        return ids[key]
+
+    def save_group(self, group, lectures, page_hash=None):
+        # lectures as extract_all_lectures returns them, None when the page had no schedule table
+        connection = self.connection()
+        ids = {}
+        with connection:
+            connection.execute(
+                "INSERT INTO groups (code, page_hash, has_table, refreshed_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (code) DO UPDATE SET page_hash = excluded.page_hash, has_table = excluded.has_table, "
+                "refreshed_at = excluded.refreshed_at",
+                (group, page_hash, lectures is not None, time.time())
+            )
+            group_id = connection.execute("SELECT id FROM groups WHERE code = ?", (group,)).fetchone()[0]
+            connection.execute("DELETE FROM lecture_weeks WHERE group_id = ?", (group_id,))
+            connection.execute("DELETE FROM lectures WHERE group_id = ?", (group_id,))
+
+            for position, lecture in enumerate(lectures or ()):
+                mask = f"{lecture['Weeks']:x}"
+                if ('week_masks', mask) not in ids:
+                    connection.execute("INSERT OR IGNORE INTO week_masks (mask) VALUES (?)", (mask,))
+                    ids['week_masks', mask] = connection.execute(
+                        "SELECT id FROM week_masks WHERE mask = ?", (mask,)
+                    ).fetchone()[0]
+                day = lecture['Day'] or ''
+                lecture_id = connection.execute(
+                    'INSERT INTO lectures (group_id, position, day, time, start, "end", subgroup, subject_id, '
+                    'teacher_id, room_id, mask_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (group_id, position, day, lecture['Time'], lecture['Start'], lecture['End'], lecture['Subgroup'],
+                     self._intern(connection, 'subjects', lecture['Subject'], ids),
+                     self._intern(connection, 'teachers', lecture['Teacher'], ids),
+                     self._intern(connection, 'rooms', lecture['Classroom'], ids),
+                     ids['week_masks', mask])
+                ).lastrowid
+                connection.executemany(
+                    "INSERT INTO lecture_weeks (group_id, week, day, position, lecture_id) VALUES (?, ?, ?, ?, ?)",
+                    [(group_id, week, day, position, lecture_id) for week in mask_weeks(lecture['Weeks'])]
+                )
+
+    def groups(self):
+        # -> {group: (page hash, whether the page had a schedule table, time of the last save)}
+        rows = self.connection().execute("SELECT code, page_hash, has_table, refreshed_at FROM groups")
+        return {code: (page_hash, bool(has_table), refreshed_at) for code, page_hash, has_table, refreshed_at in rows}
+
+    def lectures(self, group):
+        # Every lecture of the group in page order, shaped like extract_all_lectures records
+        rows = self.connection().execute(
+            f"SELECT {LECTURE_COLUMNS} JOIN groups g ON g.id = l.group_id WHERE g.code = ? ORDER BY l.position",
+            (group,)
+        )
+        return [{
+            'Day': day or None,
+            'Weeks': int(mask, 16),
+            'Subgroup': subgroup,
+            'Time': time_slot,
+            'Start': start,
+            'End': end,
+            'Subject': subject,
+            'Teacher': teacher,
+            'Classroom': classroom,
+        } for day, time_slot, start, end, subgroup, subject, teacher, classroom, mask in rows]
+
+    def lecture_info(self, group, week, subgroup, sub_subgroup):
+        # Same result as extract_lecture_info on the group's page, read through the (group, week, day) index
+        rows = self.connection().execute(
+            f"SELECT {LECTURE_COLUMNS} JOIN lecture_weeks w ON w.lecture_id = l.id "
+            "WHERE w.group_id = (SELECT id FROM groups WHERE code = ?) AND w.week = ? ORDER BY w.position",
+            (group, week)
+        )
+        return week_lecture_info((
+            (day or None, time_slot, start, end, language_group, subject, teacher, classroom)
+            for day, time_slot, start, end, language_group, subject, teacher, classroom, _ in rows
+        ), subgroup, sub_subgroup)
+
+    def close(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the schedule store the bot keeps")
+    parser.add_argument('path', nargs='?', default="schedules.db")
+    parser.add_argument('--group', help="Print the group's schedule, lists the stored groups without it")
+    parser.add_argument('--week', type=int, help="Week of the schedule")
+    parser.add_argument('--subgroup', default="1 подгр")
+    parser.add_argument('--sub-subgroup', default="1 подгр")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    store = ScheduleStore(args.path)
+    if args.group is None:
+        for group, (page_hash, has_table, refreshed_at) in sorted(store.groups().items()):
+            saved = time.strftime('%Y-%m-%d %H:%M', time.localtime(refreshed_at))
+            print(f"{group}\tsaved {saved}\t{'' if has_table else 'no schedule table'}")
+        return
+    if args.week is None:
+        parser.error("--week is required with --group")
+
+    from schedule_bot import display_lecture_info  # Only the printing needs the bot module
+    print(display_lecture_info(store.lecture_info(args.group, args.week, args.subgroup, args.sub_subgroup)))
+
+
+if __name__ == '__main__':
+    main()
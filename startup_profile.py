@@ -0,0 +1,53 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+
+STARTED_AT = time.perf_counter()  # main.py imports this module first, so this is close to the interpreter start
+
+
+class StartupProfiler:
+    def __init__(self, started_at=STARTED_AT):
+        self.started_at = started_at
+        self.lock = threading.Lock()
+        self.phases = {}  # phase -> seconds spent in it, phases of different threads may overlap
+        self.marks = {}  # milestone -> seconds since the start
+        self.finished = False
+
+    @contextmanager
+    def phase(self, name):
+        if self.finished:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        with self.lock:
+            if not self.finished:
+                self.phases[name] = self.phases.get(name, 0) + seconds
+
+    def mark(self, name):
+        if name in self.marks:
+            return
+        with self.lock:
+            if name in self.marks:
+                return
+            self.marks[name] = elapsed = time.perf_counter() - self.started_at
+        logging.info(f"Startup: {name} after {elapsed:.2f} seconds")
+
+    def finish(self):
+        # Refreshes go through the same phases later on, they are not part of the startup
+        with self.lock:
+            self.finished = True
+        logging.info(self.report())
+
+    def report(self):
+        with self.lock:
+            phases = ', '.join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+            marks = ', '.join(f"{name} {seconds:.2f} s" for name, seconds in sorted(self.marks.items(), key=lambda item: item[1]))
+        return f"Startup profile: {phases or 'no phases'}; milestones: {marks or 'none'}"
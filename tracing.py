@@ -0,0 +1,111 @@
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import REGISTRY
+
+
+TRACE_SAMPLE_RATE = 0.01  # Share of ordinary traces written to the trace file
+TRACE_SLOW_SECONDS = 1.0  # Traces at least this long are always written
+
+TRACES = REGISTRY.counter('traces_total', "Finished traces by sampling decision", ['decision'])
+
+
+class Trace:
+    __slots__ = ('trace_id', 'started', 'spans')
+
+    def __init__(self, trace_id):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self.spans = []  # (name, start, duration, args), appended when a span ends
+
+
+class Tracer:
+    # Spans are kept in memory until their trace ends, only then the sampling decision is made,
+    # so a slow trace is written whole. The file is a Chrome trace event array (chrome://tracing, Perfetto)
+    # which may be left without the closing bracket, that lets traces be appended
+    def __init__(self):
+        self.path = None
+        self.sample_rate = TRACE_SAMPLE_RATE
+        self.slow_seconds = TRACE_SLOW_SECONDS
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        # perf_counter has no fixed origin, timestamps are shifted to the wall clock so files from restarts line up
+        self.epoch_offset = time.time() - time.perf_counter()
+
+    def configure(self, path, sample_rate=TRACE_SAMPLE_RATE, slow_seconds=TRACE_SLOW_SECONDS):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_seconds
+        if path:
+            logging.info(f"Tracing {sample_rate:.1%} of updates and every update slower than {slow_seconds:.2f}s to {path}")
+
+    @contextmanager
+    def trace(self, name, **args):
+        if not self.path or getattr(self.local, 'trace', None) is not None:
+            with self.span(name, **args):
+                yield
+            return
+
+        trace = self.local.trace = Trace(next(self.ids))
+        try:
+            with self.span(name, **args):
+                yield
+        finally:
+            self.local.trace = None
+            self._finish(trace)
+
+    @contextmanager
+    def span(self, name, **args):
+        trace = getattr(self.local, 'trace', None)
+        if trace is None:
+            yield args
+            return
+        started = time.perf_counter()
+        try:
+            yield args  # The caller may add results, e.g. whether a cache lookup hit
+        finally:
+            trace.spans.append((name, started, time.perf_counter() - started, args))
+
+    def _finish(self, trace):
+        duration = time.perf_counter() - trace.started
+        if duration >= self.slow_seconds:
+            TRACES.inc('slow')
+        elif random.random() < self.sample_rate:
+            TRACES.inc('sampled')
+        else:
+            TRACES.inc('dropped')
+            return
+
+        pid = os.getpid()
+        tid = threading.get_ident()
+        lines = []
+        for name, started, span_duration, args in trace.spans:
+            lines.append(json.dumps({
+                'name': name,
+                'cat': 'bot',
+                'ph': 'X',
+                'ts': round((started + self.epoch_offset) * 1e6),
+                'dur': round(span_duration * 1e6),
+                'pid': pid,
+                'tid': tid,
+                'args': {'trace_id': trace.trace_id, **args},
+            }, ensure_ascii=False, default=str))
+        try:
+            with self.lock:
+                new_file = not os.path.exists(self.path) or not os.path.getsize(self.path)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    if new_file:
+                        f.write('[\n')
+                    f.write(''.join(f"{line},\n" for line in lines))
+        except OSError as e:
+            logging.error(f"Failed to write trace {trace.trace_id}: {e}")
+
+
+TRACER = Tracer()
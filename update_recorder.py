@@ -0,0 +1,73 @@
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+
+
+MESSAGE_FIELDS = ['message_id', 'date', 'text', 'entities']  # Kept from a message, names and contacts are dropped
+USER_FIELDS = ['is_bot', 'language_code']
+CHAT_FIELDS = ['type']
+
+
+class UpdateRecorder:
+    # Appends every polled message update to a JSON lines file, user and chat IDs replaced by keyed hashes.
+    # With a fixed UPDATE_LOG_SALT a user keeps the same pseudonym across restarts
+    def __init__(self, path, salt=None):
+        self.path = path
+        self.salt = salt.encode('utf-8') if salt else os.urandom(16)
+        self.lock = threading.Lock()
+        self.pseudonyms = {}  # real id -> pseudonym, hashing once per user
+
+    def pseudonym(self, user_id):
+        pseudonym = self.pseudonyms.get(user_id)
+        if pseudonym is None:
+            digest = hmac.new(self.salt, str(user_id).encode('utf-8'), hashlib.sha256).hexdigest()
+            # Positive and below 2^48, still a valid chat ID for the fake API
+            pseudonym = self.pseudonyms[user_id] = int(digest[:12], 16)
+        return pseudonym
+
+    def anonymise(self, message):
+        anonymised = {field: message[field] for field in MESSAGE_FIELDS if field in message}
+        chat = message.get('chat', {})
+        anonymised['chat'] = {
+            'id': self.pseudonym(chat.get('id')),
+            **{field: chat[field] for field in CHAT_FIELDS if field in chat},
+        }
+        if 'from' in message:
+            user = message['from']
+            anonymised['from'] = {
+                'id': self.pseudonym(user.get('id')),
+                'first_name': "User",  # Required by the Bot API, the real one is not recorded
+                **{field: user[field] for field in USER_FIELDS if field in user},
+            }
+        return anonymised
+
+    def record(self, updates):
+        received_at = time.time()
+        lines = [
+            json.dumps({'t': received_at, 'update_id': update.update_id, 'message': self.anonymise(update.message.json)},
+                       ensure_ascii=False)
+            for update in updates if update.message is not None
+        ]
+        if not lines:
+            return
+        try:
+            with self.lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(''.join(f"{line}\n" for line in lines))
+        except OSError as e:
+            logging.error(f"Failed to record {len(lines)} updates to {self.path}: {e}")
+
+
+def read_updates(path):
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # The last line of a file still being written may be cut off
+                logging.warning(f"Skipping unreadable line {number} of {path}")